@@ -0,0 +1,185 @@
+"""
+Amenity flags from listing descriptions, all amenities from one compiled matcher.
+
+PATTERNS are compiled once into a single matcher. Each description is lowercased
+once (in place of re.IGNORECASE, which is what makes per-pattern regex searches
+slow), then:
+
+- patterns that only spell out alternatives, like `(parking|garage|off[- ]street)`,
+  are expanded into their literal strings and checked with substring search,
+  stopping at the first literal found for each amenity;
+- any other pattern goes into one combined regex with a named group per amenity,
+  scanned once and stopped as soon as all of those amenities have been seen
+  (the ones still missing after a hit are rechecked alone, since a match can
+  overlap and hide another amenity's match).
+
+Each listing gets a bitmask (bit i set when amenity i is mentioned), stored as a
+uint8 array while there are at most 8 amenities; unpack_masks turns it into the
+has_* 0/1 columns used by the models.
+
+    from amenities import amenity_flags
+    flags = amenity_flags(df_master['full_description'])   # has_laundry, has_parking, ...
+"""
+import re
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# REGEX patterns (same as Analysis_and_Modeling.ipynb)
+PATTERNS = {
+    'laundry': r'(laundry|w/d|washer/dryer|wash-dry)',
+    'parking': r'(parking|garage|off[- ]street|offstreet)',
+    'pet_friendly': r'(pet friendly|pets ok|dogs ok|cats ok)',
+    'ac': r'(air conditioning|a/c|AC unit)',
+    'gym': r'(gym|fitness center|rec room|workout room)'
+}
+
+# beyond these, a pattern is a real regex and isn't expanded into literals
+REGEX_METACHARS = set('.^$*+?{}\\')
+MAX_LITERALS = 64
+
+
+class AmenityMatcher(NamedTuple):
+    names: List[str]
+    literals: List[Tuple[int, Tuple[str, ...]]]  # (bit, lowercase literals) per literal pattern
+    regex: Optional[re.Pattern]                  # named groups for the other patterns
+    regex_bits: dict                             # group name -> bit
+    regex_all: int                               # all bits the regex can set
+    regex_single: dict                           # group name -> its own compiled pattern
+
+
+def expand_literals(pattern: str) -> Optional[List[str]]:
+    """
+    Every string a pattern made only of text, (a|b) groups and [xy] classes can
+    match, or None for anything else (or if it would expand to too many strings).
+    """
+    def parse(i, depth):
+        # returns (alternatives, next index) for the sequence starting at i
+        alternatives, current = [], [""]
+        while i < len(pattern):
+            ch = pattern[i]
+            if ch in REGEX_METACHARS:
+                return None, i
+            if ch == "(":
+                inner, i = parse(i + 1, depth + 1)
+                if inner is None or i >= len(pattern) or pattern[i] != ")":
+                    return None, i
+                current = [a + b for a in current for b in inner]
+                i += 1
+            elif ch == ")":
+                if depth == 0:
+                    return None, i
+                break
+            elif ch == "|":
+                alternatives.extend(current)
+                current = [""]
+                i += 1
+            elif ch == "[":
+                end = pattern.find("]", i + 1)
+                chars = pattern[i + 1:end] if end > i + 1 else ""
+                if not chars or chars[0] == "^" or "-" in chars[1:-1] or REGEX_METACHARS & set(chars):
+                    return None, i
+                current = [a + c for a in current for c in chars]
+                i = end + 1
+            else:
+                current = [a + ch for a in current]
+                i += 1
+            if len(current) + len(alternatives) > MAX_LITERALS:
+                return None, i
+        alternatives.extend(current)
+        return alternatives, i
+
+    literals, end = parse(0, 0)
+    if literals is None or end != len(pattern) or "" in literals:
+        return None
+    return literals
+
+
+@lru_cache(maxsize=None)
+def _compile(items) -> AmenityMatcher:
+    names = [name for name, _ in items]
+    literals, regex_parts, regex_bits = [], [], {}
+
+    for i, (name, pattern) in enumerate(items):
+        expanded = expand_literals(pattern)
+        if expanded is not None:
+            # shortest first: they're the cheapest to search and the likeliest to hit
+            literals.append((1 << i, tuple(sorted({lit.lower() for lit in expanded}, key=len))))
+        else:
+            regex_parts.append(f"(?P<{name}>{pattern})")
+            regex_bits[name] = 1 << i
+
+    # text is lowercased before scanning, IGNORECASE only matters for non-ASCII here
+    regex = re.compile("|".join(regex_parts), re.IGNORECASE) if regex_parts else None
+    regex_single = {name: re.compile(pattern, re.IGNORECASE) for name, pattern in items if name in regex_bits}
+    return AmenityMatcher(names, literals, regex, regex_bits, sum(regex_bits.values()), regex_single)
+
+
+def compile_patterns(patterns=PATTERNS) -> AmenityMatcher:
+    """Builds (and caches) the combined matcher for a dict of name -> pattern."""
+    return _compile(tuple(patterns.items()))
+
+
+def mask_dtype(n_patterns):
+    """Smallest unsigned integer type with a bit per pattern."""
+    for dtype in (np.uint8, np.uint16, np.uint32, np.uint64):
+        if n_patterns <= np.iinfo(dtype).bits:
+            return dtype
+    raise ValueError(f"at most 64 patterns fit in a bitmask, got {n_patterns}")
+
+
+def scan(matcher: AmenityMatcher, text) -> int:
+    """Bitmask of the amenities mentioned in one description (0 for missing text)."""
+    if not isinstance(text, str):
+        return 0
+    text = text.lower()
+
+    mask = 0
+    for bit, literals in matcher.literals:
+        for literal in literals:
+            if literal in text:
+                mask |= bit
+                break
+
+    if matcher.regex is not None:
+        found = 0
+        for match in matcher.regex.finditer(text):
+            found |= matcher.regex_bits[match.lastgroup]
+            if found == matcher.regex_all:
+                break
+        if found and found != matcher.regex_all:
+            # a match consumes its text, so it may have hidden an overlapping
+            # match of another amenity; recheck the missing ones on their own
+            for name, bit in matcher.regex_bits.items():
+                if not found & bit and matcher.regex_single[name].search(text):
+                    found |= bit
+        mask |= found
+    return mask
+
+
+def amenity_mask(text, patterns=PATTERNS) -> int:
+    return scan(compile_patterns(patterns), text)
+
+
+def amenity_masks(texts, patterns=PATTERNS):
+    """One bitmask per description, as a compact unsigned integer array."""
+    matcher = compile_patterns(patterns)
+    dtype = mask_dtype(len(matcher.names))
+    return np.fromiter((scan(matcher, text) for text in texts), dtype=dtype, count=len(texts))
+
+
+def unpack_masks(masks, names, prefix='has_', index=None):
+    """Expands bitmasks into one uint8 0/1 column per amenity."""
+    masks = np.asarray(masks)
+    return pd.DataFrame(
+        {f"{prefix}{name}": ((masks >> i) & 1).astype(np.uint8) for i, name in enumerate(names)},
+        index=index,
+    )
+
+
+def amenity_flags(texts, patterns=PATTERNS, prefix='has_'):
+    """has_* flag columns for a Series of descriptions, aligned to its index."""
+    masks = amenity_masks(texts, patterns)
+    return unpack_masks(masks, compile_patterns(patterns).names, prefix, index=getattr(texts, 'index', None))
@@ -0,0 +1,145 @@
+"""
+Persistent cache of API responses for the api_fetcher data sources.
+
+Census ACS, the HUD crosswalk and the DataSF tract mapping change yearly or
+quarterly, so a response is reused until its source's TTL runs out. Entries are
+keyed by URL and query parameters (never by headers, so the HUD key stays out of
+the cache), and every body is stored with its SHA-256: a body that no longer
+matches its hash is dropped and fetched again. In offline mode nothing goes to
+the network and any cached copy is served regardless of age.
+
+    api_cache.db  (one SQLite table, bodies stored inline; they're small)
+"""
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from typing import Dict, NamedTuple, Optional
+
+import requests
+
+
+class CacheMiss(Exception):
+    """Offline mode and nothing cached for the request."""
+
+
+class CachedResponse(NamedTuple):
+    url: str
+    status: int
+    content_type: str
+    body: bytes
+    fetched_at: float
+    from_cache: bool
+
+    @property
+    def text(self) -> str:
+        return self.body.decode("utf-8")
+
+    def json(self):
+        return json.loads(self.body)
+
+
+def request_key(url: str, params: Optional[Dict] = None) -> str:
+    """Stable key for a GET: the URL plus its parameters in sorted order."""
+    canonical = json.dumps([url, sorted((params or {}).items())], default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class ApiCache:
+
+    def __init__(self, db_path: str = "api_cache.db", offline: bool = False, timeout: float = 30.0):
+        """
+        offline: serve only from the cache, raising CacheMiss when there's nothing
+        timeout: seconds to wait for the upstream API
+        """
+        self.offline = offline
+        self.timeout = timeout
+        self.session = requests.Session()
+
+        # the refresh downloads run on several threads; sqlite calls go through one lock
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                params TEXT,
+                status INTEGER,
+                content_type TEXT,
+                body BLOB,
+                sha256 TEXT NOT NULL,
+                fetched_at REAL
+            )
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.session.close()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def lookup(self, url: str, params: Optional[Dict] = None) -> Optional[CachedResponse]:
+        """Returns the cached response (of any age), or None. Corrupt entries are dropped."""
+        key = request_key(url, params)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT status, content_type, body, sha256, fetched_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            status, content_type, body, digest, fetched_at = row
+            if hashlib.sha256(body).hexdigest() != digest:
+                print(f"Cached response for {url} failed its integrity check; dropping it.")
+                self.conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.conn.commit()
+                return None
+
+        return CachedResponse(url, status, content_type, body, fetched_at, True)
+
+    def store(self, url: str, params: Optional[Dict], response: requests.Response) -> CachedResponse:
+        body = response.content
+        fetched_at = time.time()
+        content_type = response.headers.get("Content-Type", "")
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (request_key(url, params), url, json.dumps(params, default=str), response.status_code,
+                 content_type, body, hashlib.sha256(body).hexdigest(), fetched_at),
+            )
+            self.conn.commit()
+        return CachedResponse(url, response.status_code, content_type, body, fetched_at, False)
+
+    def get(self, url: str, params: Optional[Dict] = None, headers: Optional[Dict] = None,
+            ttl: float = 24 * 3600) -> CachedResponse:
+        """
+        GET through the cache. A cached copy younger than ttl seconds is served
+        without touching the network. Only successful responses are stored; errors raise
+        requests.HTTPError as usual. If the API can't be reached, a stale copy is
+        served rather than failing the refresh.
+        """
+        cached = self.lookup(url, params)
+        if self.offline:
+            if cached is None:
+                raise CacheMiss(f"offline and no cached response for {url}")
+            return cached
+        if cached is not None and time.time() - cached.fetched_at < ttl:
+            return cached
+
+        try:
+            response = self.session.get(url, params=params, headers=headers, timeout=self.timeout)
+        except (requests.ConnectionError, requests.Timeout):
+            if cached is None:
+                raise
+            print(f"Couldn't reach {url}; using the cached copy from {time.ctime(cached.fetched_at)}.")
+            return cached
+
+        response.raise_for_status()
+        return self.store(url, params, response)
@@ -1,92 +1,178 @@
+import io
+import os
+import sys
+import threading
+
 import pandas as pd
 from sodapy import Socrata
 import sqlite3
 import requests
 
+from api_cache import ApiCache
+from create_db import migrate
+from dag import Node, run_dag
+
+DB_NAME = 'rentals.db'
+
 # note: possible warning "NotOpenSSLWarning: urllib3 v2 only supports OpenSSL 1.1.1+, currently the 'ssl' module is compiled with 'LibreSSL 2.8.3'"
 
 # follow instructions on `https://www.huduser.gov/portal/dataset/uspszip-api.html` to create access key for HUD USPS data
 HUD_API_KEY = "YOUR_HUD_API_TOKEN_HERE"
 
-def fetch_crime_data():
+# police incidents (2018-present) on DataSF
+CRIME_DOMAIN = 'data.sfgov.org'
+CRIME_DATASET_ID = 'wg3w-h783'
+CRIME_SINCE = '2025-01-01T00:00:00'
+CRIME_PAGE_SIZE = 1000  # grouped rows per request
+
+# ACS 5 year data, table B19013 (income) and table B01003 (population)
+# get estimate 'B19013_001E' and 'B01003_001E' for all census tracts in SF, CA
+CENSUS_API_URL = (
+    "https://api.census.gov/data/2023/acs/acs5"
+    "?get=NAME,B19013_001E,B01003_001E"
+    "&for=tract:*"
+    "&in=state:06&in=county:075"
+)
+HUD_API_URL = "https://www.huduser.gov/hudapi/public/usps"
+# dataset: "Analysis Neighborhoods - 2020 census tracts assigned to neighborhoods"
+TRACT_TO_HOOD_URL = "https://data.sfgov.org/resource/sevw-6tgi.csv"
+
+# Census, HUD and DataSF responses are reused until their TTL runs out (see api_cache.py);
+# in offline mode they are served only from the cache and crime data is left as stored
+API_CACHE_PATH = 'api_cache.db'
+API_OFFLINE = os.environ.get('API_OFFLINE') == '1'
+DAY = 24 * 3600
+CACHE_TTL = {
+    'census': 180 * DAY,  # ACS 5-year estimates are released once a year
+    'hud': 30 * DAY,      # crosswalk is published quarterly
+    'datasf': 30 * DAY,   # tract to neighborhood assignment rarely changes
+}
+
+_api_cache = None
+_api_cache_lock = threading.Lock()
+
+
+def get_api_cache():
+    """Shared ApiCache for the download functions, opened on first use."""
+    global _api_cache
+    with _api_cache_lock:
+        if _api_cache is None:
+            _api_cache = ApiCache(API_CACHE_PATH, offline=API_OFFLINE)
+        return _api_cache
+
+
+def normalize_tracts(tracts):
     """
-    Fetches 2025 crime incidents grouped by 'analysis_neighborhood' and stores them in 'raw_crime_by_neighborhood'
+    Normalizes a column of census tract IDs to 11-digit GEOIDs, vectorized
+    (same rule as normalize_tract in join_all_data). Applied once at ingest so
+    the stored tables join on tract directly.
     """
-    # use Socrata since dataSF is build on it
-    print("Fetching crime data from DataSF.")
-    client = Socrata('data.sfgov.org', None)
+    return tracts.astype(str).str.strip().str.replace(".0", "", regex=False).str.zfill(11)
 
-    # police incidents (2018-present) id
-    dataset_id = 'wg3w-h783'
 
-    # getting crime data for neighborhoods
-    soql_select = "analysis_neighborhood"
+def normalize_neighborhoods(names):
+    """Lowercase, stripped neighborhood names, the join key between crime and tracts."""
+    return names.astype(str).str.strip().str.lower()
 
-    # get all incidents from 2025
-    soql_where = "incident_date >= '2025-01-01T00:00:00'"
 
-    # set a high limit for crime data to get (on avg ~150k-200k incidents per year)
-    results = client.get(
-        dataset_id,
-        select=soql_select,
-        where=soql_where,
-        limit=250000  # up to 250,000 raw incidents
-    )
-
-    # creating dataframe for crime
-    crime_df = pd.DataFrame.from_records(results)
-    crime_df = crime_df.dropna(subset=['analysis_neighborhood'])
-
-    # convert all neighborhood names to lowercase before grouping (also strip white space)
-    crime_df['analysis_neighborhood'] = crime_df['analysis_neighborhood'].astype(str).str.strip().str.lower()
+def fetch_crime_counts(client, since=CRIME_SINCE, page_size=CRIME_PAGE_SIZE):
+    """
+    Counts incidents per 'analysis_neighborhood' on the Socrata side ($group + count(*)),
+    so only one row per neighborhood (~40) is downloaded instead of every incident
+    """
+    # date range and missing neighborhoods are filtered by the server too
+    soql_select = "analysis_neighborhood, count(*) AS crime_count"
+    soql_where = f"incident_date >= '{since}' AND analysis_neighborhood IS NOT NULL"
+
+    # page through the grouped rows (a single page unless the grouping gets finer)
+    results = []
+    offset = 0
+    while True:
+        page = client.get(
+            CRIME_DATASET_ID,
+            select=soql_select,
+            where=soql_where,
+            group="analysis_neighborhood",
+            order="analysis_neighborhood",  # stable order so pages don't overlap
+            limit=page_size,
+            offset=offset
+        )
+        results.extend(page)
+        if len(page) < page_size:
+            break
+        offset += page_size
+
+    crime_df = pd.DataFrame.from_records(results, columns=['analysis_neighborhood', 'crime_count'])
+    crime_df['crime_count'] = crime_df['crime_count'].astype(int)
+
+    # convert all neighborhood names to lowercase (also strip white space); SoQL has no trim,
+    # so names that only differ in case/spacing are summed here, over ~40 rows
+    crime_df['analysis_neighborhood'] = normalize_neighborhoods(crime_df['analysis_neighborhood'])
 
     # drop any rows that are now just an empty string
     crime_df = crime_df[crime_df['analysis_neighborhood'] != '']
-    crime_counts = crime_df.groupby('analysis_neighborhood').size()
+    return crime_df.groupby('analysis_neighborhood', as_index=False)['crime_count'].sum()
 
-    # convert crime_counts to an aggregated DataFrame
-    crime_df_agg = crime_counts.to_frame(name='crime_count').reset_index()
 
-    # verify number of neighborhoods were we find crime incidents
-    print(f"Successfully aggregated crime for {len(crime_df_agg)} neighborhoods.")
+def download_crime_data(client=None, offline=False):
+    """
+    Downloads 2025 crime incident counts grouped by 'analysis_neighborhood'.
+    Returns None in offline mode (crime counts change daily, so they aren't cached).
+    """
+    if offline:
+        print("Offline: keeping the stored crime data.")
+        return None
 
-    # store in the rentals database
-    conn = sqlite3.connect('rentals.db')
-    c = conn.cursor()
+    # use Socrata since dataSF is build on it
+    print("Fetching crime data from DataSF.")
+    if client is None:
+        client = Socrata(CRIME_DOMAIN, None)
+
+    crime_df_agg = fetch_crime_counts(client)
 
-    # explicitly delete all old data from the table
-    print("Deleting old crime data from table.")
-    c.execute("DELETE FROM raw_crime_by_neighborhood")
+    # verify number of neighborhoods were we find crime incidents
+    print(f"Successfully aggregated crime for {len(crime_df_agg)} neighborhoods "
+          f"({crime_df_agg['crime_count'].sum()} incidents).")
+    return crime_df_agg
 
-    # then, append the new DataFrame to the empty table
-    print("Appending new, clean data.")
-    crime_df_agg.to_sql(
-        'raw_crime_by_neighborhood',
+
+def store_table(conn, table, df):
+    """
+    Replaces the rows of an existing table with df. Clears and appends, so the
+    schema and its indexes stay; the caller commits.
+    """
+    conn.execute(f"DELETE FROM {table}")
+    df.to_sql(
+        table,
         conn,
         if_exists='append',
         index=False
     )
 
+
+def fetch_crime_data(client=None):
+    """
+    Fetches 2025 crime incidents grouped by 'analysis_neighborhood' and stores them in 'raw_crime_by_neighborhood'
+    """
+    crime_df_agg = download_crime_data(client, offline=API_OFFLINE)
+    if crime_df_agg is None:
+        return
+
+    # store in the rentals database (old data is deleted, then the new rows appended)
+    conn = sqlite3.connect(DB_NAME)
+    store_table(conn, 'raw_crime_by_neighborhood', crime_df_agg)
     conn.commit()
     conn.close()
     # verify data loaded into table
     print("Successfully loaded crime data into 'raw_crime_by_neighborhood' table.")
 
-def fetch_income_data():
+def download_income_data(census_api_url=CENSUS_API_URL, cache=None):
     """
-    Fetches median household income and population by census tract from the US Census.
-    Stores in 'raw_tract_data'.
+    Downloads median household income and population by census tract from the US Census.
     """
     print("\nFetching income data from Census API")
-    # ACS 5 year data, table B19013 (income) and table B01003 (population)
-    # get estimate 'B19013_001E' and 'B01003_001E' for all census tracts in SF, CA
-    census_api_url = (
-        "https://api.census.gov/data/2023/acs/acs5"
-        "?get=NAME,B19013_001E,B01003_001E"
-        "&for=tract:*"
-        "&in=state:06&in=county:075"
-    )
-    response = requests.get(census_api_url)
+    cache = cache or get_api_cache()
+    response = cache.get(census_api_url, ttl=CACHE_TTL['census'])
     data = response.json()
 
     # convert data to DataFrame with columns name, income, & tract
@@ -98,7 +184,7 @@ def fetch_income_data():
         'B01003_001E': 'total_population'
     })
     # create full 11 digit FIPS code by combining state + county + tract to get full tract id
-    income_df['tract_id'] = income_df['state'] + income_df['county'] + income_df['tract']
+    income_df['tract_id'] = normalize_tracts(income_df['state'] + income_df['county'] + income_df['tract'])
 
     # convert numbers with negative values referring to 'no data'.
     income_df['median_income'] = pd.to_numeric(income_df['median_income'])
@@ -111,28 +197,31 @@ def fetch_income_data():
 
     # print out how many tracts data is found for
     print(f"Found income/pop data for {len(income_df)} census tracts.")
+    return income_df
+
+
+def fetch_income_data():
+    """
+    Fetches median household income and population by census tract from the US Census.
+    Stores in 'tract_data'.
+    """
+    income_df = download_income_data()
 
     # store in the rentals database
-    conn = sqlite3.connect('rentals.db')
-    income_df.to_sql(
-        'tract_data',
-        conn,
-        if_exists='replace',
-        index=False,
-        dtype={'tract_id': 'TEXT PRIMARY KEY', 'median_income': 'INTEGER', 'total_population': 'INTEGER'}
-    )
+    conn = sqlite3.connect(DB_NAME)
+    store_table(conn, 'tract_data', income_df)
     conn.commit()
     conn.close()
     # confirm data is loaded into table
     print("Successfully loaded tract income and population data into 'tract_data' table.")
 
 
-def fetch_tract_to_zip_crosswalk():
+def download_tract_to_zip_crosswalk(hud_api_url=HUD_API_URL, cache=None):
     """
-    Fetches the Tract-to-Zip crosswalk file from the official HUD API
+    Downloads the Tract-to-Zip crosswalk file from the official HUD API.
+    Returns None when the download fails.
     """
     print("\nFetching Tract-to-Zip crosswalk from HUD API.")
-    hud_api_url = "https://www.huduser.gov/hudapi/public/usps"
 
     # params for first quarter data
     params = {
@@ -149,8 +238,8 @@ def fetch_tract_to_zip_crosswalk():
     # send request to HUD for tract_id / zip_code data
     try:
         print("Sending API request to HUD.")
-        response = requests.get(hud_api_url, params=params, headers=headers)
-        response.raise_for_status()
+        cache = cache or get_api_cache()
+        response = cache.get(hud_api_url, params=params, headers=headers, ttl=CACHE_TTL['hud'])
 
         data = response.json()
         crosswalk_df = pd.DataFrame(data['data']['results'])
@@ -163,7 +252,7 @@ def fetch_tract_to_zip_crosswalk():
             print("ERROR: Your API Key is wrong, invalid, or expired.")
         print(f"URL: {hud_api_url}")
         print("------------------\n")
-        return
+        return None
     print("Data was downloaded.")
 
     # API will return 'zip' and 'tract' (columns properly renamed)
@@ -172,6 +261,7 @@ def fetch_tract_to_zip_crosswalk():
 
     # get the 3 columns needed
     crosswalk_df = crosswalk_df[['tract', 'zip', 'res_ratio']]
+    crosswalk_df = crosswalk_df.assign(tract=normalize_tracts(crosswalk_df['tract']))
 
     # filter for SF tracts only (start with '06075')
     crosswalk_df = crosswalk_df[crosswalk_df['tract'].str.startswith('06075')]
@@ -181,29 +271,32 @@ def fetch_tract_to_zip_crosswalk():
     crosswalk_df = crosswalk_df[crosswalk_df['res_ratio'] > 0]
     # print number of records found
     print(f"Found {len(crosswalk_df)} Tract-to-Zip records for SF.")
+    return crosswalk_df
+
+
+def fetch_tract_to_zip_crosswalk():
+    """
+    Fetches the Tract-to-Zip crosswalk file from the official HUD API
+    """
+    crosswalk_df = download_tract_to_zip_crosswalk()
+    if crosswalk_df is None:
+        return
 
     # store in rentals database
-    conn = sqlite3.connect('rentals.db')
-    crosswalk_df.to_sql(
-        'crosswalk_tract_to_zip',
-        conn,
-        if_exists='replace',
-        index=False,
-        dtype={'tract': 'TEXT', 'zip': 'TEXT', 'res_ratio': 'REAL'}
-    )
+    conn = sqlite3.connect(DB_NAME)
+    store_table(conn, 'crosswalk_tract_to_zip', crosswalk_df)
     conn.commit()
     conn.close()
     print("Successfully loaded 'crosswalk_tract_to_zip'.")
 
-def fetch_tract_to_hood_crosswalk():
+def download_tract_to_hood_crosswalk(dataSF_url=TRACT_TO_HOOD_URL, cache=None):
     """
-    Fetches SF-specific Tract-to-Neighborhood mapping file.
+    Downloads SF-specific Tract-to-Neighborhood mapping file.
     """
     print("\nFetching Tract-to-Neighborhood crosswalk from DataSF.")
-
-    # dataset: "Analysis Neighborhoods - 2020 census tracts assigned to neighborhoods"
-    dataSF_url = "https://data.sfgov.org/resource/sevw-6tgi.csv"
-    crosswalk_df = pd.read_csv(dataSF_url)
+    cache = cache or get_api_cache()
+    response = cache.get(dataSF_url, ttl=CACHE_TTL['datasf'])
+    crosswalk_df = pd.read_csv(io.BytesIO(response.body))
 
     # only want the tract and neighborhood (renamed)
     crosswalk_df = crosswalk_df[['geoid', 'neighborhoods_analysis_boundaries']]
@@ -211,32 +304,41 @@ def fetch_tract_to_hood_crosswalk():
         'geoid': 'tract',
         'neighborhoods_analysis_boundaries': 'neighborhood'
     })
+    # geoid is read as a number, so restore the 11-digit text form
+    crosswalk_df = crosswalk_df.assign(
+        tract=normalize_tracts(crosswalk_df['tract']),
+        neighborhood=normalize_neighborhoods(crosswalk_df['neighborhood'])
+    )
 
     # print how many records found
     print(f"Found {len(crosswalk_df)} Tract-to-Neighborhood records.")
+    return crosswalk_df
+
+
+def fetch_tract_to_hood_crosswalk():
+    """
+    Fetches SF-specific Tract-to-Neighborhood mapping file.
+    """
+    crosswalk_df = download_tract_to_hood_crosswalk()
 
     # store in rental database
-    conn = sqlite3.connect('rentals.db')
-    crosswalk_df.to_sql(
-        'crosswalk_tract_to_hood',
-        conn,
-        if_exists='replace',
-        index=False,
-        dtype={'tract': 'TEXT PRIMARY KEY', 'neighborhood': 'TEXT'}
-    )
+    conn = sqlite3.connect(DB_NAME)
+    store_table(conn, 'crosswalk_tract_to_hood', crosswalk_df)
     conn.commit()
     conn.close()
     # confirm data is loaded into table
     print("Successfully loaded 'crosswalk_tract_to_hood'.")
 
 
-def join_all_data():
+def join_all_data(conn=None):
     """
     Final clean join from crime -> neighborhood -> tract -> zip.
-    Income and population data follow.
+    Income and population data follow. Uses (and leaves open) conn when given.
     """
     print("\nStarting Final Data Join.")
-    conn = sqlite3.connect('rentals.db')
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DB_NAME)
 
     # load all tables
     crime_df = pd.read_sql("SELECT * FROM raw_crime_by_neighborhood", conn)
@@ -337,26 +439,146 @@ def join_all_data():
     print(f"Final dataset contains {len(zip_grouped)} ZIP codes with income+crime data")
 
     # save final output and commit neighborhood_data to database
-    zip_grouped.to_sql(
-        'neighborhood_data',
-        conn,
-        if_exists='replace',
-        index=False,
-        dtype={
-            'zip_code': 'TEXT PRIMARY KEY',
-            'crime_count_2025': 'INTEGER',
-            'avg_median_income': 'REAL',
-            'population_2025': 'INTEGER'
-        }
-    )
+    store_table(conn, 'neighborhood_data', zip_grouped)
     conn.commit()
-    conn.close()
+    if own_conn:
+        conn.close()
     print("\nSuccessfully saved final joined data to 'neighborhood_data'.")
 
+# crime -> hood -> tract -> zip, weighted by residential ratio, same steps as join_all_data.
+# tracts and neighborhood names are normalized at ingest, so they join directly
+NEIGHBORHOOD_DATA_SQL = """
+WITH crime_by_tract AS (
+    -- crime counts assigned to every tract of their neighborhood
+    SELECT h.tract, SUM(c.crime_count) AS crime_count
+    FROM raw_crime_by_neighborhood c
+    JOIN crosswalk_tract_to_hood h ON h.neighborhood = c.analysis_neighborhood
+    WHERE c.analysis_neighborhood <> ''
+    GROUP BY h.tract
+),
+tract_grouped AS (
+    -- every tract with income data, missing crimes counted as 0
+    SELECT t.tract_id, t.median_income, t.total_population,
+           COALESCE(ct.crime_count, 0) AS crime_count
+    FROM tract_data t
+    LEFT JOIN crime_by_tract ct ON ct.tract = t.tract_id
+),
+zip_grouped AS (
+    SELECT z.zip AS zip_code,
+           ROUND(SUM(t.median_income * z.res_ratio), 2) AS avg_median_income,
+           CAST(ROUND(TOTAL(t.crime_count * z.res_ratio)) AS INTEGER) AS crime_count_2025,
+           CAST(ROUND(TOTAL(t.total_population * z.res_ratio)) AS INTEGER) AS population_2025
+    FROM tract_grouped t
+    JOIN crosswalk_tract_to_zip z ON z.tract = t.tract_id
+    GROUP BY z.zip
+)
+SELECT zip_code, crime_count_2025, avg_median_income, population_2025
+FROM zip_grouped
+WHERE avg_median_income > 0 AND population_2025 > 0
+ORDER BY zip_code
+"""
+
+
+def join_all_data_sql(conn=None):
+    """
+    SQL engine for join_all_data: runs the whole weighted aggregation inside
+    SQLite and writes 'neighborhood_data' without loading any table into pandas.
+    Only zip codes whose values changed are written, so the master_data
+    triggers refresh just those zip codes.
+    """
+    print("\nStarting Final Data Join (SQL).")
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect(DB_NAME)
+
+    conn.execute("DROP TABLE IF EXISTS temp.new_neighborhood_data")
+    conn.execute(f"CREATE TEMP TABLE new_neighborhood_data AS {NEIGHBORHOOD_DATA_SQL}")
+
+    conn.execute("""
+        DELETE FROM neighborhood_data
+        WHERE zip_code NOT IN (SELECT zip_code FROM new_neighborhood_data)
+    """)
+    conn.execute("""
+        INSERT INTO neighborhood_data (zip_code, crime_count_2025, avg_median_income, population_2025)
+        SELECT zip_code, crime_count_2025, avg_median_income, population_2025
+        FROM new_neighborhood_data WHERE true
+        ON CONFLICT(zip_code) DO UPDATE SET
+            crime_count_2025 = excluded.crime_count_2025,
+            avg_median_income = excluded.avg_median_income,
+            population_2025 = excluded.population_2025
+        WHERE crime_count_2025 IS NOT excluded.crime_count_2025
+           OR avg_median_income IS NOT excluded.avg_median_income
+           OR population_2025 IS NOT excluded.population_2025
+    """)
+    changed = conn.execute("SELECT changes()").fetchone()[0]
+    count = conn.execute("SELECT COUNT(*) FROM new_neighborhood_data").fetchone()[0]
+    conn.execute("DROP TABLE temp.new_neighborhood_data")
+    conn.commit()
+    if own_conn:
+        conn.close()
+
+    print(f"Final dataset contains {count} ZIP codes with income+crime data ({changed} changed)")
+    print("Successfully saved final joined data to 'neighborhood_data'.")
+
+
+# 'sql' runs the final join inside SQLite, 'pandas' loads the tables and merges them
+JOIN_ENGINE = 'sql'
+JOIN_ENGINES = {
+    'pandas': join_all_data,
+    'sql': join_all_data_sql,
+}
+
+
+def refresh_all(crime_client=None, census_api_url=CENSUS_API_URL, hud_api_url=HUD_API_URL,
+                dataSF_url=TRACT_TO_HOOD_URL, db_name=DB_NAME, workers=4, cache=None):
+    """
+    Refreshes every source and the final join as a small DAG: the four downloads
+    run concurrently, each result is written through one shared connection as
+    soon as it arrives, and join_all_data runs once all four tables are in.
+    Returns the per-stage timings.
+    """
+    cache = cache or get_api_cache()
+    conn = sqlite3.connect(db_name)
+    # fetchers clear and append into existing tables, so make sure the schema is current
+    migrate(conn)
+
+    def store(table):
+        def write(conn, df):
+            # a failed HUD download (or offline crime) keeps the previous table
+            if df is not None:
+                store_table(conn, table, df)
+                conn.commit()
+        return write
+
+    nodes = {
+        'download_crime': Node(lambda: download_crime_data(crime_client, offline=cache.offline)),
+        'download_income': Node(lambda: download_income_data(census_api_url, cache)),
+        'download_zip_crosswalk': Node(lambda: download_tract_to_zip_crosswalk(hud_api_url, cache)),
+        'download_hood_crosswalk': Node(lambda: download_tract_to_hood_crosswalk(dataSF_url, cache)),
+        'store_crime': Node(store('raw_crime_by_neighborhood'), ('download_crime',), writes=True),
+        'store_income': Node(store('tract_data'), ('download_income',), writes=True),
+        'store_zip_crosswalk': Node(store('crosswalk_tract_to_zip'), ('download_zip_crosswalk',), writes=True),
+        'store_hood_crosswalk': Node(store('crosswalk_tract_to_hood'), ('download_hood_crosswalk',), writes=True),
+        'join': Node(lambda conn, *_: JOIN_ENGINES[JOIN_ENGINE](conn),
+                     ('store_crime', 'store_income', 'store_zip_crosswalk', 'store_hood_crosswalk'), writes=True),
+    }
+
+    try:
+        _, timings = run_dag(nodes, conn, workers=workers)
+    finally:
+        conn.close()
+
+    print("\nRefresh timings:")
+    for name, seconds in timings.items():
+        print(f"  {name}: {seconds:.2f}s")
+    downloads = [seconds for name, seconds in timings.items() if name.startswith('download_')]
+    print(f"  sum of downloads {sum(downloads):.2f}s, slowest {max(downloads):.2f}s")
+    return timings
+
+
 # main call
 if __name__ == "__main__":
-    fetch_crime_data()
-    fetch_income_data()
-    fetch_tract_to_zip_crosswalk()
-    fetch_tract_to_hood_crosswalk()
-    join_all_data()
+    # `python api_fetcher.py --offline` refreshes from the response cache only
+    if '--offline' in sys.argv:
+        API_OFFLINE = True
+    refresh_all()
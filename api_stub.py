@@ -0,0 +1,253 @@
+"""
+Local replay server for the api_fetcher data sources, used to verify the
+fetchers offline against recorded responses.
+
+Each recording in `fixtures/api/*.json` holds the request path, the query
+parameters the fetcher is expected to send (everything except $limit/$offset),
+and the recorded response: `rows` for Socrata JSON, `json` for any other JSON
+payload, or `text` with a `content_type`. A request whose query doesn't match
+its recording is answered with 400, so a fetcher that stops pushing its
+aggregation to the server fails loudly instead of silently passing.
+$limit/$offset are applied to `rows`, so paging is exercised too. Per-path
+latency can be added to stand in for slow upstream APIs.
+
+The recordings keep the live response shapes; the values are synthetic.
+
+    python api_stub.py          # replay the crime fetch and report the transfer
+    python api_stub.py refresh  # replay a full refresh with per-source latency
+    python api_stub.py cache    # cold, warm and offline runs through the response cache
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit, urlunsplit
+
+import requests
+from sodapy import Socrata
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "api")
+
+# seconds added before answering, roughly how the live APIs compare
+DEFAULT_LATENCY = {
+    "/resource/wg3w-h783.json": 1.0,
+    "/data/2023/acs/acs5": 1.5,
+    "/hudapi/public/usps": 2.0,
+    "/resource/sevw-6tgi.csv": 0.5,
+}
+
+
+def load_recordings() -> dict:
+    """Returns the recordings keyed by request path."""
+    recordings = {}
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if name.endswith(".json"):
+            with open(os.path.join(FIXTURE_DIR, name)) as f:
+                recording = json.load(f)
+            recordings[recording["path"]] = recording
+    return recordings
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    recordings: dict = {}
+    latency: dict = {}
+    log: list = []  # (path, query, rows returned, bytes sent) per request
+
+    def send_body(self, status, body, content_type="application/json"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        return len(body)
+
+    def send_json(self, status, payload):
+        return self.send_body(status, json.dumps(payload).encode("utf-8"))
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {}
+        for key, value in parse_qsl(url.query):
+            # repeated parameters (census `in=`) become lists
+            query[key] = query[key] + [value] if isinstance(query.get(key), list) \
+                else [query[key], value] if key in query else value
+
+        recording = self.recordings.get(url.path)
+        if recording is None:
+            self.send_json(404, {"error": f"no recording for {url.path}"})
+            return
+        if self.latency.get(url.path):
+            time.sleep(self.latency[url.path])
+
+        expected = recording["query"]
+        received = {k: v for k, v in query.items() if k not in ("$limit", "$offset")}
+        if received != expected:
+            self.send_json(400, {"error": "query doesn't match the recording",
+                                 "expected": expected, "received": received})
+            return
+
+        if "rows" in recording:
+            offset = int(query.get("$offset", 0))
+            limit = int(query.get("$limit", 1000))
+            rows = recording["rows"][offset:offset + limit]
+            sent = self.send_json(200, rows)
+        elif "json" in recording:
+            rows = recording["json"]
+            sent = self.send_json(200, rows)
+        else:
+            rows = recording["text"].splitlines()[1:]
+            sent = self.send_body(200, recording["text"].encode("utf-8"), recording["content_type"])
+        self.log.append((url.path, query, len(rows), sent))
+
+    def log_message(self, format, *args):
+        # silence the per-request access log
+        pass
+
+
+def serve_in_background(port: int = 0, latency: dict = None):
+    """
+    Starts the replay server on a daemon thread.
+    Returns (server, request_log); call server.shutdown() when done.
+    """
+    handler = type("Handler", (ReplayHandler,), {
+        "recordings": load_recordings(),
+        "latency": latency or {},
+        "log": [],
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, handler.log
+
+
+def socrata_client(server) -> Socrata:
+    """A Socrata client pointed at the replay server over plain HTTP."""
+    host, port = server.server_address[:2]
+    adapter = {"prefix": "http://", "adapter": requests.adapters.HTTPAdapter()}
+    return Socrata(f"{host}:{port}", None, session_adapter=adapter)
+
+
+def local_url(server, url: str) -> str:
+    """Points a live API url (path and query kept) at the replay server."""
+    host, port = server.server_address[:2]
+    parts = urlsplit(url)
+    return urlunsplit(("http", f"{host}:{port}", parts.path, parts.query, ""))
+
+
+def verify_crime(page_size: int = 16):
+    """
+    Replays the crime fetch with a small page size (so paging kicks in) and checks
+    the totals against the recording.
+    """
+    from api_fetcher import fetch_crime_counts
+
+    server, log = serve_in_background()
+    try:
+        client = socrata_client(server)
+        start = time.perf_counter()
+        crime_df = fetch_crime_counts(client, page_size=page_size)
+        elapsed = time.perf_counter() - start
+    finally:
+        server.shutdown()
+
+    recording = load_recordings()["/resource/wg3w-h783.json"]
+    expected = sum(int(row["crime_count"]) for row in recording["rows"])
+    assert len(crime_df) == len(recording["rows"]), "missing neighborhoods"
+    assert crime_df["crime_count"].sum() == expected, "incident totals don't match"
+
+    rows = sum(entry[2] for entry in log)
+    sent = sum(entry[3] for entry in log)
+    print(f"crime: {len(crime_df)} neighborhoods, {expected} incidents, "
+          f"{len(log)} requests, {rows} rows, {sent / 1024:.1f} KB in {elapsed * 1000:.0f} ms")
+    return crime_df
+
+
+def verify_refresh(latency: dict = None):
+    """
+    Replays a full refresh_all into a scratch database, with per-source latency,
+    and compares the wall time with the sum and the slowest of the downloads.
+    """
+    import api_fetcher
+    from api_cache import ApiCache
+
+    latency = DEFAULT_LATENCY if latency is None else latency
+    server, log = serve_in_background(latency=latency)
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, "rentals.db")
+        cache = ApiCache(os.path.join(tmp, "api_cache.db"))
+        try:
+            start = time.perf_counter()
+            api_fetcher.refresh_all(
+                crime_client=socrata_client(server),
+                census_api_url=local_url(server, api_fetcher.CENSUS_API_URL),
+                hud_api_url=local_url(server, api_fetcher.HUD_API_URL),
+                dataSF_url=local_url(server, api_fetcher.TRACT_TO_HOOD_URL),
+                db_name=db_name,
+                cache=cache,
+            )
+            elapsed = time.perf_counter() - start
+        finally:
+            server.shutdown()
+            cache.close()
+
+        with sqlite3.connect(db_name) as conn:
+            zips = conn.execute("SELECT COUNT(*) FROM neighborhood_data").fetchone()[0]
+
+    print(f"\nrefresh: {len(log)} requests, {zips} zip codes, {elapsed:.2f}s wall "
+          f"(replayed latency: sum {sum(latency.values()):.2f}s, slowest {max(latency.values(), default=0):.2f}s)")
+    return elapsed
+
+
+def verify_cache(latency: dict = None):
+    """
+    Runs the Census, HUD and DataSF downloads through a scratch ApiCache three
+    times: cold, warm, and offline with the replay server shut down.
+    """
+    import api_fetcher
+    from api_cache import ApiCache
+
+    latency = DEFAULT_LATENCY if latency is None else latency
+    server, log = serve_in_background(latency=latency)
+    urls = {name: local_url(server, url) for name, url in (
+        ("census", api_fetcher.CENSUS_API_URL),
+        ("hud", api_fetcher.HUD_API_URL),
+        ("datasf", api_fetcher.TRACT_TO_HOOD_URL),
+    )}
+
+    def download_all(cache):
+        start = time.perf_counter()
+        frames = (
+            api_fetcher.download_income_data(urls["census"], cache),
+            api_fetcher.download_tract_to_zip_crosswalk(urls["hud"], cache),
+            api_fetcher.download_tract_to_hood_crosswalk(urls["datasf"], cache),
+        )
+        return frames, time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "api_cache.db")
+        with ApiCache(db_path) as cache:
+            cold, cold_seconds = download_all(cache)
+            warm, warm_seconds = download_all(cache)
+        server.shutdown()
+        server.server_close()
+        with ApiCache(db_path, offline=True) as cache:
+            offline, offline_seconds = download_all(cache)
+
+    for before, after_warm, after_offline in zip(cold, warm, offline):
+        assert before.equals(after_warm) and before.equals(after_offline), "cached download differs from the live one"
+    print(f"\ncache: cold {cold_seconds * 1000:.0f} ms ({len(log)} requests), "
+          f"warm {warm_seconds * 1000:.0f} ms, offline {offline_seconds * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["refresh"]:
+        verify_refresh()
+    elif sys.argv[1:] == ["cache"]:
+        verify_cache()
+    else:
+        verify_crime()
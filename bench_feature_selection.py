@@ -0,0 +1,63 @@
+"""
+Benchmark of feature_selection.FastRFECV against sklearn's RFECV(LinearRegression)
+on synthetic listings data, from 10 to 500 features. Checks both select the same
+features with the same CV R^2 curve before reporting times.
+
+    python bench_feature_selection.py                  # 10..500 features, 4000 rows
+    python bench_feature_selection.py 10,50,100 2000   # feature counts, rows
+"""
+import sys
+import time
+
+import numpy as np
+from sklearn.feature_selection import RFECV
+from sklearn.linear_model import LinearRegression
+from sklearn.model_selection import KFold
+
+from feature_selection import FastRFECV
+
+FEATURE_COUNTS = [10, 25, 50, 100, 200, 500]
+
+
+def make_data(n_rows, n_features, seed=13):
+    """Listing-like design: a few real drivers, 0/1 amenity dummies, correlated noise columns."""
+    rng = np.random.default_rng(seed)
+    n_numeric = max(n_features // 5, 2)
+    numeric = rng.normal(size=(n_rows, n_numeric)) * rng.uniform(1, 1000, n_numeric)
+    numeric[:, 1:] += 0.3 * numeric[:, :1] * rng.uniform(0, 1, n_numeric - 1)
+    dummies = (rng.random((n_rows, n_features - n_numeric)) < rng.uniform(0.05, 0.5, n_features - n_numeric))
+    X = np.hstack([numeric, dummies.astype(float)])
+
+    coef = np.zeros(n_features)
+    drivers = rng.choice(n_features, size=max(n_features // 4, 3), replace=False)
+    coef[drivers] = rng.normal(size=len(drivers)) * 300 / (X[:, drivers].std(axis=0) + 1e-9)
+    y = 3000 + X @ coef + rng.normal(scale=600, size=n_rows)
+    return X, y
+
+
+def timed(fit):
+    start = time.perf_counter()
+    result = fit()
+    return result, time.perf_counter() - start
+
+
+def bench(feature_counts=FEATURE_COUNTS, n_rows=4000):
+    cv = KFold(n_splits=5, shuffle=True, random_state=13)
+    print(f"{'features':>8}  {'RFECV':>9}  {'FastRFECV':>9}  {'speedup':>7}  {'selected':>8}  max |dR2|")
+    for n_features in feature_counts:
+        X, y = make_data(n_rows, n_features)
+        slow, slow_seconds = timed(lambda: RFECV(LinearRegression(), step=1, cv=cv, scoring='r2').fit(X, y))
+        fast, fast_seconds = timed(lambda: FastRFECV(cv=cv).fit(X, y))
+
+        assert (slow.support_ == fast.support_).all(), f"different features selected at {n_features}"
+        assert (slow.ranking_ == fast.ranking_).all(), f"different ranking at {n_features}"
+        curve_diff = np.abs(slow.cv_results_['mean_test_score'] - fast.cv_results_['mean_test_score']).max()
+        print(f"{n_features:>8}  {slow_seconds:>8.2f}s  {fast_seconds:>8.3f}s  "
+              f"{slow_seconds / fast_seconds:>6.0f}x  {fast.n_features_:>8}  {curve_diff:.1e}")
+
+
+if __name__ == '__main__':
+    bench(
+        [int(n) for n in sys.argv[1].split(',')] if len(sys.argv) > 1 else FEATURE_COUNTS,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 4000,
+    )
@@ -0,0 +1,100 @@
+"""
+Benchmark of the two join_all_data engines (pandas merges vs one SQL query)
+on the replayed API fixtures, optionally scaled up by copying every tract.
+Checks both engines write the same 'neighborhood_data' before timing them.
+
+    python bench_join.py           # fixture size (~240 tracts), 20 runs each
+    python bench_join.py 50 5      # 50x the tracts, 5 runs each
+"""
+import contextlib
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+import api_fetcher
+import api_stub
+from api_cache import ApiCache
+
+
+def build_db(db_name: str, cache_path: str):
+    """Fills a scratch rentals.db from the replay server."""
+    server, _ = api_stub.serve_in_background()
+    try:
+        with ApiCache(cache_path) as cache, contextlib.redirect_stdout(io.StringIO()):
+            api_fetcher.refresh_all(
+                crime_client=api_stub.socrata_client(server),
+                census_api_url=api_stub.local_url(server, api_fetcher.CENSUS_API_URL),
+                hud_api_url=api_stub.local_url(server, api_fetcher.HUD_API_URL),
+                dataSF_url=api_stub.local_url(server, api_fetcher.TRACT_TO_HOOD_URL),
+                db_name=db_name,
+                cache=cache,
+            )
+    finally:
+        server.shutdown()
+
+
+def scale_tracts(conn, copies: int):
+    """Adds copies-1 renumbered copies of every tract to the three tract tables."""
+    for i in range(1, copies):
+        # shift the tract number into digits the real IDs don't use
+        shifted = f"printf('%011d', CAST(tract{{}} AS INTEGER) + {i} * 100000000000)"
+        conn.execute(f"""
+            INSERT INTO tract_data SELECT {shifted.format('_id')}, median_income, total_population
+            FROM tract_data WHERE length(tract_id) = 11
+        """)
+        conn.execute(f"""
+            INSERT INTO crosswalk_tract_to_zip SELECT {shifted.format('')}, zip, res_ratio
+            FROM crosswalk_tract_to_zip WHERE length(tract) = 11
+        """)
+        conn.execute(f"""
+            INSERT INTO crosswalk_tract_to_hood SELECT {shifted.format('')}, neighborhood
+            FROM crosswalk_tract_to_hood WHERE length(tract) = 11
+        """)
+    conn.commit()
+
+
+def run_engine(engine: str, conn) -> float:
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        api_fetcher.JOIN_ENGINES[engine](conn)
+    return time.perf_counter() - start
+
+
+def read_output(conn) -> pd.DataFrame:
+    return pd.read_sql("SELECT * FROM neighborhood_data ORDER BY zip_code", conn)
+
+
+def bench(copies: int = 1, runs: int = 20):
+    with tempfile.TemporaryDirectory() as tmp:
+        db_name = os.path.join(tmp, "rentals.db")
+        build_db(db_name, os.path.join(tmp, "api_cache.db"))
+
+        conn = sqlite3.connect(db_name)
+        scale_tracts(conn, copies)
+        tracts = conn.execute("SELECT COUNT(*) FROM tract_data").fetchone()[0]
+
+        outputs = {}
+        for engine in ("pandas", "sql"):
+            run_engine(engine, conn)
+            outputs[engine] = read_output(conn)
+        pd.testing.assert_frame_equal(outputs["pandas"], outputs["sql"], check_dtype=False, check_exact=True)
+        print(f"Both engines wrote the same {len(outputs['sql'])} rows of neighborhood_data "
+              f"from {tracts} tracts.")
+
+        for engine in ("pandas", "sql"):
+            seconds = sorted(run_engine(engine, conn) for _ in range(runs))
+            print(f"  {engine:>6}: median {seconds[len(seconds) // 2] * 1000:.1f} ms, "
+                  f"best {seconds[0] * 1000:.1f} ms over {runs} runs")
+        conn.close()
+
+
+if __name__ == "__main__":
+    bench(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 1,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 20,
+    )
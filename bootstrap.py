@@ -0,0 +1,157 @@
+"""
+Bootstrap confidence intervals for the price model's coefficients (the amenity
+dollar values in Analysis_and_Modeling.ipynb).
+
+A resample is a weight per listing: how often the bootstrap drew it, or 0/1 for
+a cross-validation training set. A batch of resamples is a weight matrix W
+(resamples x listings), and every weighted least-squares system in the batch
+comes out of two matrix products, W @ (row-wise outer products of X) and
+W @ (X * y), followed by one batched solve. Batches are spread over a process
+pool; each batch draws from its own seed, so results don't depend on the
+number of workers.
+
+    from bootstrap import bootstrap_coefficients, notebook_design
+    X, y = notebook_design(df_master)
+    bootstrap_coefficients(X, y, n_resamples=2000)   # coef, std_error, lower, upper per feature
+
+    python bootstrap.py [master_data.csv] [n_resamples]
+"""
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from amenities import amenity_flags
+from incremental_model import FEATURES, IMPUTED
+
+CSV_PATH = 'master_data.csv'
+N_RESAMPLES = 2000
+BATCH_SIZE = 250
+SEED = 13
+
+# set in each worker process by init_worker, so the data is sent once per process
+_design = None
+
+
+def notebook_design(df):
+    """X and y as the notebook builds them: amenity flags, median-imputed size columns, other gaps 0."""
+    df = df.copy()
+    missing_flags = [col for col in FEATURES if col.startswith('has_') and col not in df.columns]
+    if missing_flags:
+        df = df.join(amenity_flags(df['full_description']))
+    for col in IMPUTED:
+        df[col] = df[col].fillna(df[col].median())
+    return df[FEATURES].fillna(0).astype(float), df['price'].astype(float)
+
+
+def resample_weights(rng, n_rows, n_resamples, scheme='bootstrap', folds=5):
+    """
+    One row of weights per resample.
+    bootstrap: multinomial counts (rows drawn with replacement, n_rows draws)
+    cv:        0/1 training-set indicators of repeated shuffled K-fold splits
+    """
+    if scheme == 'bootstrap':
+        return rng.multinomial(n_rows, np.full(n_rows, 1 / n_rows), size=n_resamples).astype(np.float64)
+    if scheme == 'cv':
+        weights = np.ones((n_resamples, n_rows))
+        for start in range(0, n_resamples, folds):
+            fold_of = rng.permutation(n_rows) % folds
+            for k in range(min(folds, n_resamples - start)):
+                weights[start + k, fold_of == k] = 0
+        return weights
+    raise ValueError(f"unknown resampling scheme {scheme!r}")
+
+
+def prepare(X, y):
+    """
+    Per-row pieces of the weighted normal equations, with an intercept column.
+    Columns are scaled to unit range first so the batched solves are well conditioned.
+    """
+    Z = np.hstack([np.ones((len(X), 1)), X])
+    scale = np.abs(Z).max(axis=0)
+    scale[scale == 0] = 1.0
+    Z = Z / scale
+    outer = (Z[:, :, None] * Z[:, None, :]).reshape(len(Z), -1)
+    return outer, Z * y[:, None], scale
+
+
+def solve_batch(W, outer, zy, scale):
+    """Coefficients (intercept first) of the weighted least-squares fit for every row of W."""
+    p = len(scale)
+    gram = (W @ outer).reshape(len(W), p, p)
+    rhs = W @ zy
+    try:
+        coef = np.linalg.solve(gram, rhs[:, :, None])[:, :, 0]
+    except np.linalg.LinAlgError:
+        # a resample without any listing with some amenity: minimum-norm fit, as LinearRegression
+        coef = np.stack([np.linalg.lstsq(g, r, rcond=None)[0] for g, r in zip(gram, rhs)])
+    return coef / scale
+
+
+def init_worker(outer, zy, scale):
+    global _design
+    _design = (outer, zy, scale)
+
+
+def run_batch(seed, n_resamples, scheme, folds):
+    outer, zy, scale = _design
+    W = resample_weights(np.random.default_rng(seed), len(outer), n_resamples, scheme, folds)
+    return solve_batch(W, outer, zy, scale)
+
+
+def bootstrap_coefficients(X, y, n_resamples=N_RESAMPLES, ci=0.95, scheme='bootstrap', folds=5,
+                           batch_size=BATCH_SIZE, workers=None, seed=SEED, return_draws=False):
+    """
+    Percentile confidence intervals for each coefficient of the linear regression of y on X.
+
+    Returns a DataFrame indexed by feature (and 'intercept') with the full-data
+    coef, the resampled std_error and the lower/upper percentile bounds; with
+    return_draws, also the (n_resamples x features) array of resampled fits.
+    workers: processes for the batches (default: all CPUs; 1 runs in-process)
+    """
+    names = ['intercept'] + list(getattr(X, 'columns', range(np.shape(X)[1])))
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    outer, zy, scale = prepare(X, y)
+
+    sizes = [min(batch_size, n_resamples - start) for start in range(0, n_resamples, batch_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    jobs = [(s, size, scheme, folds) for s, size in zip(seeds, sizes)]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        init_worker(outer, zy, scale)
+        batches = [run_batch(*job) for job in jobs]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                                 initargs=(outer, zy, scale)) as executor:
+            batches = list(executor.map(run_batch, *zip(*jobs)))
+    draws = np.vstack(batches)
+
+    full = solve_batch(np.ones((1, len(y))), outer, zy, scale)[0]
+    alpha = (1 - ci) / 2
+    result = pd.DataFrame({
+        'coef': full,
+        'std_error': draws.std(axis=0, ddof=1),
+        'lower': np.quantile(draws, alpha, axis=0),
+        'upper': np.quantile(draws, 1 - alpha, axis=0),
+    }, index=pd.Index(names, name='feature'))
+    return (result, draws) if return_draws else result
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else CSV_PATH
+    n_resamples = int(sys.argv[2]) if len(sys.argv) > 2 else N_RESAMPLES
+    X, y = notebook_design(pd.read_csv(path))
+
+    start = time.perf_counter()
+    intervals = bootstrap_coefficients(X, y, n_resamples)
+    elapsed = time.perf_counter() - start
+    print(f"{n_resamples} bootstrap fits on {len(y)} listings in {elapsed:.2f}s:")
+    for name, row in intervals.iterrows():
+        if name.startswith('has_'):
+            print(f"  Dollar Value Per {name}: ${row['coef']:.0f} per month "
+                  f"(95% CI ${row['lower']:.0f} to ${row['upper']:.0f})")
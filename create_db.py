@@ -1,13 +1,10 @@
 import sqlite3
 
-# creating file 'rentals.db' in project folder
-conn = sqlite3.connect('rentals.db')
-c = conn.cursor()
-print("Database rentals.db created.")
+DB_NAME = 'rentals.db'
 
 # create 'rentals' table with defined columns for webscraping portion
-# note: can add more later if needed
-c.execute("""
+# note: can add more later if needed (as a new migration below)
+RENTALS_DDL = """
 CREATE TABLE IF NOT EXISTS rentals (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
     post_id TEXT UNIQUE,
@@ -20,60 +17,460 @@ CREATE TABLE IF NOT EXISTS rentals (
     full_description TEXT,
     scraped_date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 )
-""")
-print("Table 'rentals' created successfully.")
+"""
 
 # table stores data by zip code, the final join key
-c.execute("""
+NEIGHBORHOOD_DATA_DDL = """
 CREATE TABLE IF NOT EXISTS neighborhood_data (
     zip_code TEXT PRIMARY KEY,
     crime_count_2025 INTEGER,
-    avg_median_income REAL 
-    population_2025 REAL
+    avg_median_income REAL,
+    population_2025 INTEGER
 )
-""")
-print("Table 'neighborhood_data' created.")
+"""
 
 # store the raw data from the crime API (use neighborhood as key)
-c.execute("""
+RAW_CRIME_DDL = """
 CREATE TABLE IF NOT EXISTS raw_crime_by_neighborhood (
     analysis_neighborhood TEXT PRIMARY KEY,
     crime_count INTEGER
 )
-""")
-print("Table 'raw_crime_by_neighborhood' created.")
+"""
 
 # temp table to hold the income and population data before mapping it to zip codes
-c.execute("""
+TRACT_DATA_DDL = """
 CREATE TABLE IF NOT EXISTS tract_data (
     tract_id TEXT PRIMARY KEY,
-    median_income INTEGER
+    median_income INTEGER,
     total_population INTEGER
 )
-""")
-print("Table 'tract_data' created.")
+"""
 
 # 'crosswalk_tract_to_zip' table (to transfer census data to zipcodes)
-c.execute("""
+CROSSWALK_ZIP_DDL = """
 CREATE TABLE IF NOT EXISTS crosswalk_tract_to_zip (
     tract TEXT,
     zip TEXT,
-    res_ratio REAL, 
+    res_ratio REAL,
     PRIMARY KEY (tract, zip)
 )
-""")
-print("Table 'crosswalk_tract_to_zip' created.")
+"""
 
 # 'crosswalk_tract_to_hood' table (final link of tract id to neighborhood)
-c.execute("""
+CROSSWALK_HOOD_DDL = """
 CREATE TABLE IF NOT EXISTS crosswalk_tract_to_hood (
     tract TEXT PRIMARY KEY,
     neighborhood TEXT
 )
-""")
-print("Table 'crosswalk_tract_to_hood' created.")
+"""
 
-# tables and database created
-conn.commit()
-conn.close()
-print("Database rentals.db and all tables are ready.")
+
+def rebuild_table(conn, name, ddl):
+    """
+    Recreates a table from its correct DDL and copies over the columns the old
+    and new versions share. Fixes tables created by the old broken DDL or
+    replaced by pandas (no primary key, wrong column types).
+    """
+    old_columns = [row[1] for row in conn.execute(f"PRAGMA table_info({name})")]
+    conn.execute(f"ALTER TABLE {name} RENAME TO {name}_old")
+    conn.execute(ddl)
+    new_columns = [row[1] for row in conn.execute(f"PRAGMA table_info({name})")]
+
+    shared = ", ".join(col for col in new_columns if col in old_columns)
+    if shared:
+        conn.execute(f"INSERT OR IGNORE INTO {name} ({shared}) SELECT {shared} FROM {name}_old")
+    conn.execute(f"DROP TABLE {name}_old")
+
+
+def migration_1(conn):
+    """Base schema."""
+    for ddl in (RENTALS_DDL, NEIGHBORHOOD_DATA_DDL, RAW_CRIME_DDL, TRACT_DATA_DDL,
+                CROSSWALK_ZIP_DDL, CROSSWALK_HOOD_DDL):
+        conn.execute(ddl)
+
+
+def migration_2(conn):
+    """
+    Fix tables from the original one-shot script (missing commas folded
+    population_2025 / total_population into the previous column's type) and
+    tables that the fetchers had replaced through pandas.
+    """
+    for name, ddl in (("neighborhood_data", NEIGHBORHOOD_DATA_DDL),
+                      ("tract_data", TRACT_DATA_DDL),
+                      ("crosswalk_tract_to_zip", CROSSWALK_ZIP_DDL),
+                      ("crosswalk_tract_to_hood", CROSSWALK_HOOD_DDL)):
+        rebuild_table(conn, name, ddl)
+
+
+def migration_3(conn):
+    """Content hash and price history for the incremental loader in insert_rentals.py."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(rentals)")}
+    if 'content_hash' not in columns:
+        conn.execute("ALTER TABLE rentals ADD COLUMN content_hash TEXT")
+
+    # price changes seen by the incremental loader
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS rentals_history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        post_id TEXT,
+        old_price INTEGER,
+        new_price INTEGER,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+
+def migration_4(conn):
+    """Indexes for the access paths used downstream (see QUERY_PLAN_CHECKS)."""
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rentals_zip_code ON rentals(zip_code)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rentals_neighborhood ON rentals(neighborhood)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rentals_scraped_date ON rentals(scraped_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_crosswalk_zip ON crosswalk_tract_to_zip(zip)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rentals_history_post_id ON rentals_history(post_id)")
+
+
+def migration_5(conn):
+    """Normalize stored tract IDs and neighborhood names once, so joins can run in SQL."""
+    # same rule as api_fetcher.normalize_tracts: strip, drop a float '.0', left-pad to 11 digits
+    normalized = """
+        CASE WHEN length(replace(trim({col}), '.0', '')) < 11
+             THEN substr('00000000000' || replace(trim({col}), '.0', ''), -11)
+             ELSE replace(trim({col}), '.0', '') END
+    """
+    for table, col in (("tract_data", "tract_id"),
+                       ("crosswalk_tract_to_zip", "tract"),
+                       ("crosswalk_tract_to_hood", "tract")):
+        conn.execute(f"UPDATE OR REPLACE {table} SET {col} = {normalized.format(col=col)}")
+
+    conn.execute("UPDATE OR REPLACE crosswalk_tract_to_hood SET neighborhood = lower(trim(neighborhood))")
+    conn.execute("""
+        UPDATE OR REPLACE raw_crime_by_neighborhood
+        SET analysis_neighborhood = lower(trim(analysis_neighborhood))
+    """)
+
+
+# columns of the master dataset: the listing followed by its zip code's neighborhood data
+MASTER_RENTAL_COLUMNS = ['id', 'post_id', 'price', 'bedrooms', 'bathrooms', 'sqft', 'zip_code',
+                         'neighborhood', 'full_description', 'scraped_date']
+MASTER_NEIGHBORHOOD_COLUMNS = ['avg_median_income', 'crime_count_2025', 'population_2025']
+
+# selects the master rows for the rentals matched by {where}
+MASTER_SELECT = f"""
+    SELECT {', '.join('r.' + col for col in MASTER_RENTAL_COLUMNS)},
+           {', '.join('n.' + col for col in MASTER_NEIGHBORHOOD_COLUMNS)}
+    FROM rentals r
+    JOIN neighborhood_data n ON n.zip_code = r.zip_code
+    WHERE {{where}}
+"""
+
+
+def migration_6(conn):
+    """
+    Materialized master_data table (rentals joined with neighborhood_data by zip
+    code), kept current by triggers on both tables.
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS master_data (
+        id INTEGER PRIMARY KEY,
+        post_id TEXT,
+        price INTEGER,
+        bedrooms REAL,
+        bathrooms REAL,
+        sqft INTEGER,
+        zip_code TEXT,
+        neighborhood TEXT,
+        full_description TEXT,
+        scraped_date TIMESTAMP,
+        avg_median_income REAL,
+        crime_count_2025 INTEGER,
+        population_2025 INTEGER
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_master_zip_code ON master_data(zip_code)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_master_scraped_date ON master_data(scraped_date)")
+    conn.execute("INSERT OR REPLACE INTO master_data " + MASTER_SELECT.format(where="1"))
+
+    # a listing enters, changes or leaves the master set with its own row only
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS master_rentals_insert AFTER INSERT ON rentals BEGIN
+        INSERT OR REPLACE INTO master_data {MASTER_SELECT.format(where="r.id = NEW.id")};
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS master_rentals_update
+    AFTER UPDATE OF {', '.join(MASTER_RENTAL_COLUMNS)} ON rentals BEGIN
+        DELETE FROM master_data WHERE id = OLD.id;
+        INSERT OR REPLACE INTO master_data {MASTER_SELECT.format(where="r.id = NEW.id")};
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS master_rentals_delete AFTER DELETE ON rentals BEGIN
+        DELETE FROM master_data WHERE id = OLD.id;
+    END
+    """)
+
+    # new or changed neighborhood data only touches the listings in its zip code
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS master_neighborhood_insert AFTER INSERT ON neighborhood_data BEGIN
+        INSERT OR REPLACE INTO master_data {MASTER_SELECT.format(where="r.zip_code = NEW.zip_code")};
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS master_neighborhood_update
+    AFTER UPDATE ON neighborhood_data WHEN OLD.zip_code IS NEW.zip_code BEGIN
+        UPDATE master_data
+        SET {', '.join(f'{col} = NEW.{col}' for col in MASTER_NEIGHBORHOOD_COLUMNS)}
+        WHERE zip_code = NEW.zip_code;
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER IF NOT EXISTS master_neighborhood_rekey
+    AFTER UPDATE ON neighborhood_data WHEN OLD.zip_code IS NOT NEW.zip_code BEGIN
+        DELETE FROM master_data WHERE zip_code = OLD.zip_code;
+        INSERT OR REPLACE INTO master_data {MASTER_SELECT.format(where="r.zip_code = NEW.zip_code")};
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS master_neighborhood_delete AFTER DELETE ON neighborhood_data BEGIN
+        DELETE FROM master_data WHERE zip_code = OLD.zip_code;
+    END
+    """)
+
+
+def migration_7(conn):
+    """Text feature store: amenity bitmasks per listing, keyed by description hash and pattern version."""
+    # one bit per pattern; a pattern whose text changes gets a new version and is recomputed
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS feature_patterns (
+        name TEXT PRIMARY KEY,
+        bit INTEGER UNIQUE NOT NULL,
+        pattern TEXT NOT NULL,
+        version TEXT NOT NULL
+    )
+    """)
+    # mask holds the matches, computed which pattern bits have been evaluated for desc_hash;
+    # source_hash is the rentals.content_hash the row was last checked against
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS text_features (
+        post_id TEXT PRIMARY KEY,
+        desc_hash TEXT,
+        source_hash TEXT,
+        mask INTEGER NOT NULL DEFAULT 0,
+        computed INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+
+
+def migration_8(conn):
+    """Full-text index over rentals.full_description (FTS5), kept in sync by triggers."""
+    # external content table: the index stores only tokens, the text stays in rentals
+    conn.execute("""
+    CREATE VIRTUAL TABLE IF NOT EXISTS rentals_fts USING fts5(
+        full_description,
+        content='rentals',
+        content_rowid='id',
+        tokenize='porter unicode61'
+    )
+    """)
+    conn.execute("INSERT INTO rentals_fts(rentals_fts) VALUES ('rebuild')")
+
+    # an external content index must be told the old text to remove it
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS rentals_fts_insert AFTER INSERT ON rentals BEGIN
+        INSERT INTO rentals_fts(rowid, full_description) VALUES (NEW.id, NEW.full_description);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS rentals_fts_delete AFTER DELETE ON rentals BEGIN
+        INSERT INTO rentals_fts(rentals_fts, rowid, full_description)
+        VALUES ('delete', OLD.id, OLD.full_description);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS rentals_fts_update AFTER UPDATE OF full_description ON rentals BEGIN
+        INSERT INTO rentals_fts(rentals_fts, rowid, full_description)
+        VALUES ('delete', OLD.id, OLD.full_description);
+        INSERT INTO rentals_fts(rowid, full_description) VALUES (NEW.id, NEW.full_description);
+    END
+    """)
+
+
+def migration_9(conn):
+    """Near-duplicate detection: MinHash signatures, LSH buckets and rentals.canonical_listing_id."""
+    columns = {row[1] for row in conn.execute("PRAGMA table_info(rentals)")}
+    if 'canonical_listing_id' not in columns:
+        # rentals.id of the earliest listing of the same unit (its own id if it's unique)
+        conn.execute("ALTER TABLE rentals ADD COLUMN canonical_listing_id INTEGER")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rentals_canonical ON rentals(canonical_listing_id)")
+
+    # desc_hash tells whether the stored signature is still for the current description,
+    # source_hash is the rentals.content_hash it was last checked against
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS listing_signatures (
+        listing_id INTEGER PRIMARY KEY,
+        desc_hash TEXT,
+        source_hash TEXT,
+        signature BLOB NOT NULL
+    )
+    """)
+    # one row per listing and LSH band; listings sharing a (band, bucket) are candidates
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS lsh_buckets (
+        band INTEGER NOT NULL,
+        bucket BLOB NOT NULL,
+        listing_id INTEGER NOT NULL,
+        PRIMARY KEY (band, bucket, listing_id)
+    ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_lsh_buckets_listing ON lsh_buckets(listing_id)")
+
+
+def migration_10(conn):
+    """Incremental price model state: per-date-bucket sufficient statistics and value histograms."""
+    # the values each listing was folded in with, so a change or removal can be subtracted exactly
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS model_rows (
+        listing_id INTEGER PRIMARY KEY,
+        bucket TEXT NOT NULL,
+        price REAL,
+        bedrooms REAL,
+        bathrooms REAL,
+        sqft REAL,
+        avg_median_income REAL,
+        crime_count_2025 REAL,
+        amenity_mask INTEGER
+    )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_model_rows_bucket ON model_rows(bucket)")
+    # Z'Z and Z'y (float64 blobs) of the design [1, features, missing indicators] per scrape date
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS model_buckets (
+        bucket TEXT PRIMARY KEY,
+        n INTEGER NOT NULL,
+        ztz BLOB NOT NULL,
+        zty BLOB NOT NULL,
+        yty REAL NOT NULL
+    )
+    """)
+    # e.g. retired_before: buckets older than this were dropped and aren't folded in again
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS model_settings (
+        name TEXT PRIMARY KEY,
+        value TEXT
+    )
+    """)
+    # value counts of the imputed columns, for medians over any range of buckets
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS model_histograms (
+        bucket TEXT NOT NULL,
+        feature TEXT NOT NULL,
+        value REAL NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (bucket, feature, value)
+    ) WITHOUT ROWID
+    """)
+
+
+def migration_11(conn):
+    """Re-indexes a description only when its text changed, not on every update that sets the column."""
+    conn.execute("DROP TRIGGER IF EXISTS rentals_fts_update")
+    conn.execute("""
+    CREATE TRIGGER rentals_fts_update AFTER UPDATE OF full_description ON rentals
+    WHEN OLD.full_description IS NOT NEW.full_description BEGIN
+        INSERT INTO rentals_fts(rentals_fts, rowid, full_description)
+        VALUES ('delete', OLD.id, OLD.full_description);
+        INSERT INTO rentals_fts(rowid, full_description) VALUES (NEW.id, NEW.full_description);
+    END
+    """)
+
+
+# each migration runs once, in order; PRAGMA user_version records the last one applied.
+# never edit a released migration, add a new one instead
+MIGRATIONS = [
+    (1, migration_1),
+    (2, migration_2),
+    (3, migration_3),
+    (4, migration_4),
+    (5, migration_5),
+    (6, migration_6),
+    (7, migration_7),
+    (8, migration_8),
+    (9, migration_9),
+    (10, migration_10),
+    (11, migration_11),
+]
+
+
+def migrate(conn):
+    """Brings the schema up to the latest version. Safe to call on every connect."""
+    current = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    for version, migration in MIGRATIONS:
+        if version <= current:
+            continue
+
+        # each migration and its version bump commit together (DDL included)
+        conn.execute("BEGIN")
+        try:
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {version}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        print(f"Applied migration {version}: {migration.__doc__.strip().splitlines()[0]}")
+
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+# queries the pipeline runs against rentals.db, with the index each one should use
+QUERY_PLAN_CHECKS = [
+    ("rentals by zip", "SELECT * FROM rentals WHERE zip_code = '94110'", "idx_rentals_zip_code"),
+    ("rentals by neighborhood", "SELECT * FROM rentals WHERE neighborhood = 'mission'", "idx_rentals_neighborhood"),
+    ("rentals since date", "SELECT * FROM rentals WHERE scraped_date >= '2025-11-01'", "idx_rentals_scraped_date"),
+    ("crosswalk by zip", "SELECT * FROM crosswalk_tract_to_zip WHERE zip = '94110'", "idx_crosswalk_zip"),
+    ("master rows by zip", "SELECT * FROM master_data WHERE zip_code = '94110'", "idx_master_zip_code"),
+    ("master rows since date", "SELECT * FROM master_data WHERE scraped_date >= '2025-11-01'",
+     "idx_master_scraped_date"),
+    ("rentals for one zip's neighborhood data",
+     "SELECT r.price, n.avg_median_income FROM neighborhood_data n "
+     "JOIN rentals r ON r.zip_code = n.zip_code WHERE n.zip_code = '94110'",
+     "idx_rentals_zip_code"),
+]
+
+
+def check_query_plans(conn):
+    """
+    Runs EXPLAIN QUERY PLAN for each downstream query and reports whether it
+    uses its index or falls back to a full table scan. Returns the failures.
+    """
+    failures = []
+    for name, sql, index in QUERY_PLAN_CHECKS:
+        plan = " | ".join(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}"))
+        ok = index in plan
+        print(f"  [{'ok' if ok else 'FULL SCAN'}] {name}: {plan}")
+        if not ok:
+            failures.append(name)
+    return failures
+
+
+def main():
+    # creating file 'rentals.db' in project folder
+    conn = sqlite3.connect(DB_NAME)
+    print(f"Database {DB_NAME} opened.")
+
+    version = migrate(conn)
+    print(f"Schema is at version {version}.")
+
+    print("Checking query plans:")
+    failures = check_query_plans(conn)
+
+    # tables and database created
+    conn.close()
+    if failures:
+        print(f"WARNING: {len(failures)} queries are not using their index: {failures}")
+    print(f"Database {DB_NAME} and all tables are ready.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Minimal DAG runner for the data refresh.
+
+Nodes without `writes` (network downloads) run concurrently on a thread pool.
+Writer nodes run one at a time on the calling thread with the shared SQLite
+connection, as soon as their dependencies are done, so writes are serialized
+through a single connection and never contend for the database lock.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, NamedTuple, Tuple
+
+
+class Node(NamedTuple):
+    # readers are called with their dependencies' results,
+    # writers with the connection followed by their dependencies' results
+    run: Callable
+    deps: Tuple[str, ...] = ()
+    writes: bool = False
+
+
+def run_dag(nodes: Dict[str, Node], conn, workers: int = 4):
+    """
+    Runs every node once its dependencies have finished.
+    Returns (results by node name, seconds by node name in completion order).
+    The first failing node cancels whatever hasn't started and re-raises.
+    """
+    for name, node in nodes.items():
+        missing = [dep for dep in node.deps if dep not in nodes]
+        if missing:
+            raise ValueError(f"node {name} depends on unknown nodes {missing}")
+
+    results = {}
+    timings = {}
+    waiting = dict(nodes)
+
+    def timed(name, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        timings[name] = time.perf_counter() - start
+        return result
+
+    def ready(writes):
+        return [name for name, node in waiting.items()
+                if node.writes == writes and all(dep in results for dep in node.deps)]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        running = {}
+        try:
+            while waiting or running:
+                for name in ready(writes=False):
+                    node = waiting.pop(name)
+                    args = [results[dep] for dep in node.deps]
+                    running[executor.submit(timed, name, node.run, *args)] = name
+
+                # writers run here, between downloads, in dependency order
+                writers = ready(writes=True)
+                for name in writers:
+                    node = waiting.pop(name)
+                    results[name] = timed(name, node.run, conn, *[results[dep] for dep in node.deps])
+                if writers:
+                    continue
+
+                if not running:
+                    raise ValueError(f"dependency cycle between {sorted(waiting)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results[running.pop(future)] = future.result()
+        finally:
+            for future in running:
+                future.cancel()
+
+    return results, timings
@@ -0,0 +1,285 @@
+"""
+Near-duplicate detection for reposted listings (MinHash + LSH), in rentals.db.
+
+Landlords repost the same unit under a new post_id. Each description is cut
+into word shingles and summarized by a MinHash signature (NUM_PERM minimums of
+hashed shingles); the signature is split into BANDS bands and every band is a
+bucket key in lsh_buckets. Only listings sharing a bucket are compared, and a
+pair counts as the same unit when its estimated Jaccard similarity is at least
+SIMILARITY and zip code, bedrooms and price (within PRICE_TOLERANCE) agree.
+Matches are grouped with union-find and rentals.canonical_listing_id is set to
+the earliest id in each group (a listing's own id when it has no duplicate).
+
+Signatures and buckets are persisted, so a run only signs new or changed
+listings and looks up their buckets. When a listing is edited (text, price, zip
+code or bedrooms) or deleted, only the groups it touched are formed again from
+their members' pairs; --rebuild re-clusters every listing.
+
+    python dedup.py              # sign new listings and update canonical_listing_id
+    python dedup.py --rebuild    # recluster every listing
+"""
+import re
+import sqlite3
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from create_db import migrate
+from feature_store import description_hash
+
+DB_NAME = 'rentals.db'
+BATCH_SIZE = 2000
+
+SHINGLE_SIZE = 3      # words per shingle
+NUM_PERM = 128
+BANDS = 16            # 16 bands of 8 rows: pairs above ~0.7 similarity almost always share a bucket
+ROWS = NUM_PERM // BANDS
+SIMILARITY = 0.8      # estimated Jaccard similarity for two descriptions to match
+PRICE_TOLERANCE = 0.1
+SEED = 141
+
+# stored with every signature, so changing any of the parameters re-signs everything
+SIGNATURE_VERSION = f"{SEED}-{SHINGLE_SIZE}-{NUM_PERM}-{BANDS}"
+
+# universal hashing (a * x + b) mod p, one (a, b) per permutation
+MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_rng = np.random.default_rng(SEED)
+PERM_A = _rng.integers(1, (1 << 61) - 1, NUM_PERM, dtype=np.uint64)
+PERM_B = _rng.integers(0, (1 << 61) - 1, NUM_PERM, dtype=np.uint64)
+
+# craigslist prepends this to every post
+BOILERPLATE = re.compile(r'qr code link to this post')
+WORD = re.compile(r'\w+')
+
+
+def shingles(text):
+    """Sorted crc32 hashes of the description's word shingles (empty for missing text)."""
+    if not isinstance(text, str):
+        return np.empty(0, dtype=np.uint64)
+    words = WORD.findall(BOILERPLATE.sub(' ', text.lower()))
+    grams = {' '.join(words[i:i + SHINGLE_SIZE]) for i in range(max(len(words) - SHINGLE_SIZE + 1, 1))}
+    grams.discard('')
+    return np.array(sorted(zlib.crc32(g.encode('utf-8')) for g in grams), dtype=np.uint64)
+
+
+def minhash(hashes):
+    """MinHash signature (NUM_PERM uint32) of a set of shingle hashes, or None if it's empty."""
+    if not len(hashes):
+        return None
+    # uint64 products wrap around, which is fine for hashing
+    permuted = (hashes[:, None] * PERM_A + PERM_B) % MERSENNE_PRIME & np.uint64(0xFFFFFFFF)
+    return permuted.min(axis=0).astype(np.uint32)
+
+
+def band_keys(signature):
+    return [signature[band * ROWS:(band + 1) * ROWS].tobytes() for band in range(BANDS)]
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity: the share of signature positions that agree."""
+    return float(np.mean(sig_a == sig_b))
+
+
+def same_unit(a, b):
+    """Zip code, bedrooms and price (within PRICE_TOLERANCE) agree for two (zip, beds, price) rows."""
+    (zip_a, beds_a, price_a), (zip_b, beds_b, price_b) = a, b
+    # without a zip code only the text would match, which isn't enough
+    if zip_a is None or zip_b is None or zip_a != zip_b or beds_a != beds_b:
+        return False
+    if price_a is None or price_b is None:
+        return price_a is price_b
+    return abs(price_a - price_b) <= PRICE_TOLERANCE * max(price_a, price_b)
+
+
+def update_signatures(conn, batch_size=BATCH_SIZE):
+    """
+    Signs listings that are new or whose description changed and refreshes their
+    buckets; drops signatures of deleted listings. Returns the new, re-signed,
+    moved (only price/zip/beds changed) and orphaned (shared a bucket with a
+    deleted listing) ids and the number removed.
+    """
+    # as in feature_store: rows whose content_hash hasn't moved are skipped unread
+    candidates = conn.execute("""
+        SELECT r.id, r.content_hash, s.desc_hash
+        FROM rentals r
+        LEFT JOIN listing_signatures s ON s.listing_id = r.id
+        WHERE s.listing_id IS NULL
+           OR r.content_hash IS NULL
+           OR s.source_hash IS NOT r.content_hash
+    """).fetchall()
+
+    new, resigned, moved = [], [], []
+    for start in range(0, len(candidates), batch_size):
+        batch = candidates[start:start + batch_size]
+        texts = dict(conn.execute(
+            f"SELECT id, full_description FROM rentals WHERE id IN ({', '.join('?' for _ in batch)})",
+            [row[0] for row in batch],
+        ))
+
+        signatures, buckets, touched = [], [], []
+        for listing_id, content_hash, old_hash in batch:
+            text = texts.get(listing_id)
+            new_hash = f"{SIGNATURE_VERSION}:{description_hash(text)}"
+            if old_hash == new_hash:
+                # only the price/beds/etc. changed; the signature still holds, the matches may not
+                conn.execute("UPDATE listing_signatures SET source_hash = ? WHERE listing_id = ?",
+                             (content_hash, listing_id))
+                moved.append(listing_id)
+                continue
+
+            (new if old_hash is None else resigned).append(listing_id)
+            touched.append((listing_id,))
+            signature = minhash(shingles(text))
+            # listings without any text get an empty signature and no buckets
+            signatures.append((listing_id, new_hash, content_hash,
+                               b'' if signature is None else signature.tobytes()))
+            if signature is not None:
+                buckets.extend((band, key, listing_id) for band, key in enumerate(band_keys(signature)))
+
+        conn.executemany("DELETE FROM lsh_buckets WHERE listing_id = ?", touched)
+        conn.executemany("INSERT OR REPLACE INTO listing_signatures VALUES (?, ?, ?, ?)", signatures)
+        conn.executemany("INSERT OR IGNORE INTO lsh_buckets VALUES (?, ?, ?)", buckets)
+
+    # a deleted listing's row (and so its group) is gone, but anything it matched shared a bucket with it
+    # (CROSS JOIN keeps the few deleted signatures as the outer loop, not the whole bucket table)
+    orphaned = [row[0] for row in conn.execute("""
+        SELECT DISTINCT r.id
+        FROM listing_signatures s
+        CROSS JOIN lsh_buckets a ON a.listing_id = s.listing_id
+        CROSS JOIN lsh_buckets b ON b.band = a.band AND b.bucket = a.bucket AND b.listing_id != a.listing_id
+        CROSS JOIN rentals r ON r.id = b.listing_id
+        WHERE s.listing_id NOT IN (SELECT id FROM rentals)
+    """)]
+    conn.execute("DELETE FROM lsh_buckets WHERE listing_id NOT IN (SELECT id FROM rentals)")
+    removed = conn.execute(
+        "DELETE FROM listing_signatures WHERE listing_id NOT IN (SELECT id FROM rentals)"
+    ).rowcount
+    conn.commit()
+    return new, resigned, moved, orphaned, removed
+
+
+def candidate_pairs(conn, listing_ids=None):
+    """(a, b) pairs with a < b sharing an LSH bucket; only pairs touching listing_ids if given."""
+    if listing_ids is None:
+        return set(conn.execute("""
+            SELECT DISTINCT a.listing_id, b.listing_id
+            FROM lsh_buckets a
+            JOIN lsh_buckets b ON b.band = a.band AND b.bucket = a.bucket AND b.listing_id > a.listing_id
+        """))
+
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS dedup_new (listing_id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM dedup_new")
+    conn.executemany("INSERT OR IGNORE INTO dedup_new VALUES (?)", [(i,) for i in listing_ids])
+    pairs = conn.execute("""
+        SELECT DISTINCT a.listing_id, b.listing_id
+        FROM dedup_new n
+        JOIN lsh_buckets a ON a.listing_id = n.listing_id
+        JOIN lsh_buckets b ON b.band = a.band AND b.bucket = a.bucket AND b.listing_id != a.listing_id
+    """).fetchall()
+    conn.execute("DELETE FROM dedup_new")
+    return {(min(a, b), max(a, b)) for a, b in pairs}
+
+
+def matching_pairs(conn, pairs):
+    """The candidate pairs that are the same unit (similar text and same zip/beds/price)."""
+    ids = sorted({i for pair in pairs for i in pair})
+    signatures, listings = {}, {}
+    for start in range(0, len(ids), BATCH_SIZE):
+        chunk = ids[start:start + BATCH_SIZE]
+        marks = ', '.join('?' for _ in chunk)
+        for listing_id, blob in conn.execute(
+                f"SELECT listing_id, signature FROM listing_signatures WHERE listing_id IN ({marks})", chunk):
+            signatures[listing_id] = np.frombuffer(blob, dtype=np.uint32)
+        for listing_id, *row in conn.execute(
+                f"SELECT id, zip_code, bedrooms, price FROM rentals WHERE id IN ({marks})", chunk):
+            listings[listing_id] = tuple(row)
+
+    return [(a, b) for a, b in pairs
+            if same_unit(listings[a], listings[b]) and similarity(signatures[a], signatures[b]) >= SIMILARITY]
+
+
+def group_members(conn, listing_ids):
+    """The listings in the same groups as listing_ids (listing_ids included)."""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS dedup_touched (listing_id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM dedup_touched")
+    conn.executemany("INSERT OR IGNORE INTO dedup_touched VALUES (?)", [(i,) for i in listing_ids])
+    members = [row[0] for row in conn.execute("""
+        SELECT listing_id FROM dedup_touched
+        UNION
+        SELECT r.id FROM rentals r
+        WHERE r.canonical_listing_id IN (
+            SELECT canonical_listing_id FROM rentals WHERE id IN (SELECT listing_id FROM dedup_touched))
+    """)]
+    conn.execute("DELETE FROM dedup_touched")
+    return members
+
+
+def assign_canonical(conn, matches, regroup=None):
+    """
+    Merges matches into groups and points every listing at its group's smallest
+    id. The groups of the regroup ids are formed again from matches; the other
+    existing groups are kept and only grown (regroup=None forms every group
+    again). Returns the number of rows whose canonical_listing_id changed.
+    """
+    current = dict(conn.execute("SELECT id, canonical_listing_id FROM rentals"))
+    reset = set(current) if regroup is None else set(regroup)
+    parent = {i: i if i in reset or canonical is None or canonical not in current else canonical
+              for i, canonical in current.items()}
+
+    def find(i):
+        root = i
+        while parent[root] != root:
+            root = parent[root]
+        while parent[i] != root:
+            parent[i], i = root, parent[i]
+        return root
+
+    for a, b in matches:
+        root_a, root_b = find(a), find(b)
+        if root_a != root_b:
+            parent[max(root_a, root_b)] = min(root_a, root_b)
+
+    updates = [(find(i), i) for i in current if current[i] != find(i)]
+    conn.executemany("UPDATE rentals SET canonical_listing_id = ? WHERE id = ?", updates)
+    conn.commit()
+    return len(updates)
+
+
+def dedupe(conn, rebuild=False):
+    """Brings signatures and canonical_listing_id up to date. Returns counts of the work done."""
+    new, resigned, moved, orphaned, removed = update_signatures(conn)
+    if rebuild:
+        regroup = None
+        pairs = candidate_pairs(conn)
+    else:
+        # an edited or deleted listing may have been what held its group together, so those
+        # groups are formed again from their members' pairs; new listings only join groups
+        regroup = group_members(conn, resigned + moved + orphaned)
+        pairs = candidate_pairs(conn, new + regroup)
+    matches = matching_pairs(conn, pairs)
+    changed = assign_canonical(conn, matches, regroup)
+    return {'signed': len(new) + len(resigned), 'moved': len(moved), 'removed': removed,
+            'regrouped': None if regroup is None else len(regroup),
+            'candidates': len(pairs), 'matches': len(matches), 'updated': changed}
+
+
+def main():
+    conn = sqlite3.connect(DB_NAME)
+    migrate(conn)
+    start = time.perf_counter()
+    counts = dedupe(conn, rebuild='--rebuild' in sys.argv)
+    elapsed = time.perf_counter() - start
+    total, duplicates = conn.execute(
+        "SELECT COUNT(*), SUM(canonical_listing_id != id) FROM rentals"
+    ).fetchone()
+    conn.close()
+    scope = 'every group' if counts['regrouped'] is None else f"{counts['regrouped']} listings' groups"
+    print(f"Signed {counts['signed']} listings, {counts['candidates']} candidate pairs, "
+          f"{counts['matches']} matches, re-clustered {scope} in {elapsed:.1f}s.")
+    print(f"{duplicates or 0} of {total} listings are reposts of an earlier listing.")
+
+
+if __name__ == '__main__':
+    main()
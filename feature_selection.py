@@ -0,0 +1,227 @@
+"""
+Recursive feature elimination with cross-validation for linear regression,
+computed from Gram matrices instead of refitting.
+
+Analysis_and_Modeling.ipynb runs sklearn's RFECV(LinearRegression(), step=1,
+cv=KFold(5), scoring='r2'), which refits the model from the raw rows for every
+fold and every feature count. Everything that elimination needs is a function
+of X'X, X'y, y'y and the column sums, so those are computed once per fold (one
+pass over the data for all folds), and then:
+
+- the training fold's centered Gram matrix is inverted once; dropping a
+  feature is a rank-one downdate of the inverse (Schur complement), O(p^2)
+  instead of a fresh O(n p^2) fit (refactored every REFACTOR_EVERY rounds);
+- coefficients (and so the coef^2 ranking RFE uses) come from the inverse;
+- the held-out R^2 comes from the test fold's Gram matrix, without predicting.
+
+FastRFECV has the same results as RFECV: support_, ranking_, n_features_ and
+cv_results_ (mean_test_score, std_test_score, split{i}_test_score,
+n_features), plus the refitted model's coef_ and intercept_. That holds for
+full-rank designs. With collinear columns (every level of a dummy, or a dummy
+that is all zeros in a fold) the least-squares fit isn't unique; FastRFECV uses
+the minimum-norm fit, which LinearRegression doesn't reliably return, so the
+elimination order can differ there. Encode dummies with drop_first and rare
+levels grouped.
+
+    from feature_selection import FastRFECV
+    rfecv = FastRFECV(cv=KFold(n_splits=5, shuffle=True, random_state=13)).fit(X_train, y_train)
+    best_features = X_train.columns[rfecv.support_].tolist()
+"""
+from typing import NamedTuple
+
+import numpy as np
+import pandas as pd
+
+# elimination rounds between refactorizations, which shrink the matrices and reset rounding error
+REFACTOR_EVERY = 64
+# a centered column this small relative to its raw sum of squares is constant in the fold
+CONSTANT_TOL = 1e-9
+
+
+class GramStats(NamedTuple):
+    n: int
+    sum_x: np.ndarray
+    sum_y: float
+    xtx: np.ndarray
+    xty: np.ndarray
+    yty: float
+
+
+def gram_stats(X, y):
+    return GramStats(len(y), X.sum(axis=0), y.sum(), X.T @ X, X.T @ y, y @ y)
+
+
+def subtract(total, part):
+    """Statistics of the rows in total but not in part (the training fold)."""
+    return GramStats(*(a - b for a, b in zip(total, part)))
+
+
+def centered(stats):
+    """Column means and the centered Gram matrix / cross products (what an intercept model sees)."""
+    mean_x = stats.sum_x / stats.n
+    mean_y = stats.sum_y / stats.n
+    xtx = stats.xtx - stats.n * np.outer(mean_x, mean_x)
+    xty = stats.xty - stats.n * mean_x * mean_y
+    return mean_x, mean_y, xtx, xty
+
+
+def r2_from_stats(stats, features, coef, intercept, xtx=None):
+    """
+    R^2 of intercept + X[:, features] @ coef on the rows summarized by stats.
+    xtx: stats.xtx already restricted to features, if the caller has it.
+    """
+    if xtx is None:
+        xtx = stats.xtx[np.ix_(features, features)]
+    sse = (stats.yty - 2 * intercept * stats.sum_y - 2 * coef @ stats.xty[features]
+           + stats.n * intercept ** 2 + 2 * intercept * coef @ stats.sum_x[features] + coef @ xtx @ coef)
+    sst = stats.yty - stats.sum_y ** 2 / stats.n
+    return 1 - sse / sst
+
+
+def inverse(matrix):
+    """Inverse of a Gram matrix, or None when it's singular (collinear features)."""
+    try:
+        np.linalg.cholesky(matrix)
+    except np.linalg.LinAlgError:
+        return None
+    return np.linalg.inv(matrix)
+
+
+def drop_from_inverse(inv, position):
+    """
+    Downdates, in place, the inverse of a Gram matrix to leave out one feature.
+    Its row and column become zero, so it drops out of inv @ X'y as well.
+    """
+    column = inv[:, position].copy()
+    if column[position] == 0:
+        return  # already left out (a constant column)
+    inv -= np.outer(column, column) / column[position]
+    inv[position, :] = 0
+    inv[:, position] = 0
+
+
+def eliminate(train, test=None, step=1, min_features=1):
+    """
+    Runs RFE with linear regression from the fold statistics.
+
+    Returns, for every feature count visited, a tuple
+    (features, coef, intercept, test R^2 or None).
+    """
+    mean_x, mean_y, xtx, xty = centered(train)
+    features = np.arange(len(mean_x))
+    steps = []
+
+    while True:
+        # factor the surviving features once, then downdate; dropped features stay in
+        # the arrays as zeros until the next refactorization shrinks them
+        sub_xtx = xtx[np.ix_(features, features)]
+        sub_xty = xty[features]
+        test_xtx = test.xtx[np.ix_(features, features)] if test is not None else None
+        # a column that is constant in this fold (a rare dummy) gets coef 0, as in
+        # LinearRegression, and stays out of the inverse
+        varying = np.diag(sub_xtx) > CONSTANT_TOL * np.maximum(np.diag(train.xtx)[features], 1e-300)
+        inv = np.zeros_like(sub_xtx)
+        part = inverse(sub_xtx[np.ix_(varying, varying)])
+        if part is None:
+            inv = None
+        else:
+            inv[np.ix_(varying, varying)] = part
+        active = np.ones(len(features), dtype=bool)
+
+        for _ in range(REFACTOR_EVERY):
+            if inv is None:
+                # collinear features: minimum-norm least squares, like LinearRegression
+                coef = np.zeros(len(features))
+                fit = active & varying
+                coef[fit] = np.linalg.pinv(sub_xtx[np.ix_(fit, fit)]) @ sub_xty[fit]
+            else:
+                coef = inv @ sub_xty
+            intercept = mean_y - mean_x[features] @ coef
+            score = r2_from_stats(test, features, coef, intercept, test_xtx) if test is not None else None
+            steps.append((features[active], coef[active], intercept, score))
+
+            positions = np.flatnonzero(active)
+            if len(positions) <= min_features:
+                return steps
+
+            # same rule as sklearn's RFE: drop the smallest coef^2, ties to the first feature
+            ranks = np.argsort(coef[positions] ** 2, kind='stable')
+            drop = positions[ranks[:min(step, len(positions) - min_features)]]
+            if inv is not None:
+                for position in drop:
+                    drop_from_inverse(inv, position)
+            active[drop] = False
+
+        features = features[active]
+
+
+def kfold_splits(n_samples, n_splits):
+    """Contiguous folds, the same as an unshuffled KFold."""
+    indices = np.arange(n_samples)
+    for test in np.array_split(indices, n_splits):
+        yield np.setdiff1d(indices, test), test
+
+
+class FastRFECV:
+
+    def __init__(self, cv=5, step=1, min_features_to_select=1):
+        """
+        cv:                      number of contiguous folds, or a splitter with a
+                                 split(X, y) method (e.g. sklearn's KFold)
+        step:                    features dropped per elimination round
+        min_features_to_select:  smallest feature count evaluated
+        """
+        self.cv = cv
+        self.step = step
+        self.min_features_to_select = min_features_to_select
+
+    def fit(self, X, y):
+        if isinstance(X, pd.DataFrame):
+            self.feature_names_in_ = np.asarray(X.columns, dtype=object)
+        X = np.asarray(X, dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        n_features = X.shape[1]
+        min_features = min(self.min_features_to_select, n_features)
+
+        # shifting by the overall means changes no fit or score but keeps the
+        # Gram matrices small, so fold statistics can be subtracted safely
+        mean_x, mean_y = X.mean(axis=0), y.mean()
+        X = X - mean_x
+        y = y - mean_y
+
+        if isinstance(self.cv, int):
+            splits = list(kfold_splits(len(y), self.cv))
+        else:
+            splits = list(self.cv.split(X, y))
+
+        # one pass over the rows: every fold's statistics; a training fold is the total minus its fold
+        total = gram_stats(X, y)
+        scores = []
+        for _, test in splits:
+            test_stats = gram_stats(X[test], y[test])
+            steps = eliminate(subtract(total, test_stats), test_stats, self.step, min_features)
+            scores.append([score for _, _, _, score in steps])
+
+        # reversed to go from the fewest features up, so ties pick the smaller model (as RFECV)
+        scores = np.array(scores)[:, ::-1]
+        step_n_features = np.array([len(features) for features, _, _, _ in steps])[::-1]
+        self.n_features_ = int(step_n_features[np.argmax(scores.sum(axis=0))])
+
+        # the final elimination on all rows, stopped at the chosen count
+        steps = eliminate(total, step=self.step, min_features=self.n_features_)
+        features, coef, intercept, _ = steps[-1]
+        self.support_ = np.zeros(n_features, dtype=bool)
+        self.support_[features] = True
+        self.ranking_ = np.ones(n_features, dtype=int)
+        for kept, _, _, _ in steps[1:]:
+            self.ranking_[np.setdiff1d(np.arange(n_features), kept)] += 1
+
+        self.coef_ = coef
+        self.intercept_ = float(mean_y + intercept - mean_x[features] @ coef)
+        self.cv_results_ = {
+            'mean_test_score': scores.mean(axis=0),
+            'std_test_score': scores.std(axis=0),
+            **{f'split{i}_test_score': fold for i, fold in enumerate(scores)},
+            'n_features': step_n_features,
+        }
+        return self
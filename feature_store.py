@@ -0,0 +1,182 @@
+"""
+Persistent text-feature store for the amenity flags, in rentals.db.
+
+text_features keeps one amenity bitmask per listing together with the hash of
+the description it was computed from; feature_patterns gives every pattern a
+fixed bit and a version (hash of the pattern text). update_features only scans:
+
+- listings that are new, or whose description hash changed (all patterns);
+- listings missing some pattern bits, i.e. patterns added or edited since the
+  listing was scanned (only those patterns).
+
+Unchanged listings are skipped without reading their text: each row remembers
+the rentals.content_hash it was last checked against (see insert_rentals.py),
+and only rows whose content_hash moved are re-hashed. Re-running after a small
+scrape therefore costs work proportional to the new rows.
+
+    python feature_store.py    # bring the store up to date and print the counts
+"""
+import hashlib
+import sqlite3
+
+import pandas as pd
+
+from amenities import PATTERNS, compile_patterns, scan, unpack_masks
+from create_db import migrate
+
+DB_NAME = 'rentals.db'
+BATCH_SIZE = 2000
+MAX_PATTERNS = 63  # bits of a signed SQLite INTEGER
+
+
+def pattern_version(pattern):
+    return hashlib.blake2b(pattern.encode('utf-8'), digest_size=8).hexdigest()
+
+
+def description_hash(text):
+    if not isinstance(text, str):
+        return None
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=16).hexdigest()
+
+
+def sync_patterns(conn, patterns=PATTERNS):
+    """
+    Registers the patterns and returns {name: bit}. New patterns get the next
+    free bit; a pattern whose text changed keeps its bit, which is cleared from
+    every listing so it gets recomputed.
+    """
+    stored = {name: (bit, version) for name, bit, version
+              in conn.execute("SELECT name, bit, version FROM feature_patterns")}
+    used = {bit for bit, _ in stored.values()}
+
+    bits = {}
+    for name, pattern in patterns.items():
+        version = pattern_version(pattern)
+        if name in stored:
+            bit, old_version = stored[name]
+            if old_version != version:
+                print(f"Pattern '{name}' changed; it will be recomputed for every listing.")
+                conn.execute("UPDATE feature_patterns SET pattern = ?, version = ? WHERE name = ?",
+                             (pattern, version, name))
+                conn.execute("UPDATE text_features SET mask = mask & ~?, computed = computed & ~?",
+                             (1 << bit, 1 << bit))
+        else:
+            bit = next(b for b in range(MAX_PATTERNS + 1) if b not in used)
+            if bit >= MAX_PATTERNS:
+                raise ValueError(f"the feature store holds at most {MAX_PATTERNS} patterns")
+            used.add(bit)
+            conn.execute("INSERT INTO feature_patterns (name, bit, pattern, version) VALUES (?, ?, ?, ?)",
+                         (name, bit, pattern, version))
+        bits[name] = bit
+    conn.commit()
+    return bits
+
+
+def scan_bits(text, names, patterns, bits):
+    """Scans text for the named patterns and returns the matches in stored bit positions."""
+    matcher = compile_patterns({name: patterns[name] for name in names})
+    found = scan(matcher, text)
+    return sum(1 << bits[name] for i, name in enumerate(matcher.names) if found >> i & 1)
+
+
+def update_features(conn, patterns=PATTERNS, batch_size=BATCH_SIZE):
+    """
+    Brings text_features up to date with rentals and the current patterns.
+    Returns counts of the work done.
+    """
+    bits = sync_patterns(conn, patterns)
+    wanted = sum(1 << bit for bit in bits.values())
+    counts = {'new': 0, 'rescanned': 0, 'new_patterns': 0, 'rehashed': 0, 'removed': 0}
+
+    # listings whose row is missing, stale or lacks some of the wanted pattern bits
+    candidates = conn.execute("""
+        SELECT r.post_id, r.content_hash, f.desc_hash, f.mask, f.computed
+        FROM rentals r
+        LEFT JOIN text_features f ON f.post_id = r.post_id
+        WHERE f.post_id IS NULL
+           OR r.content_hash IS NULL
+           OR f.source_hash IS NOT r.content_hash
+           OR (f.computed & ?) != ?
+    """, (wanted, wanted)).fetchall()
+
+    for start in range(0, len(candidates), batch_size):
+        batch = candidates[start:start + batch_size]
+        texts = dict(conn.execute(
+            f"SELECT post_id, full_description FROM rentals WHERE post_id IN ({', '.join('?' for _ in batch)})",
+            [row[0] for row in batch],
+        ))
+
+        writes = []
+        for post_id, content_hash, desc_hash, mask, computed in batch:
+            text = texts.get(post_id)
+            new_hash = description_hash(text)
+            if mask is None:
+                counts['new'] += 1
+                mask, computed, todo = 0, 0, list(bits)
+            elif new_hash != desc_hash:
+                counts['rescanned'] += 1
+                mask, computed, todo = 0, 0, list(bits)
+            else:
+                # same description: only patterns it hasn't been scanned for
+                todo = [name for name, bit in bits.items() if not computed >> bit & 1]
+                counts['new_patterns' if todo else 'rehashed'] += 1
+
+            if todo:
+                mask |= scan_bits(text, todo, patterns, bits)
+                computed |= sum(1 << bits[name] for name in todo)
+            writes.append((post_id, new_hash, content_hash, mask, computed))
+
+        conn.executemany("""
+            INSERT INTO text_features (post_id, desc_hash, source_hash, mask, computed)
+            VALUES (?, ?, ?, ?, ?)
+            ON CONFLICT(post_id) DO UPDATE SET
+                desc_hash = excluded.desc_hash,
+                source_hash = excluded.source_hash,
+                mask = excluded.mask,
+                computed = excluded.computed
+        """, writes)
+
+    counts['removed'] = conn.execute(
+        "DELETE FROM text_features WHERE post_id NOT IN (SELECT post_id FROM rentals)"
+    ).rowcount
+    conn.commit()
+    return counts
+
+
+def load_feature_matrix(conn, patterns=PATTERNS, post_ids=None, prefix='has_'):
+    """
+    The has_* flags (uint8) for the given patterns, indexed by post_id.
+    Call update_features first so every listing and pattern is computed.
+    """
+    bits = {name: bit for name, bit in conn.execute("SELECT name, bit FROM feature_patterns")}
+    missing = [name for name in patterns if name not in bits]
+    if missing:
+        raise ValueError(f"patterns not in the feature store yet (run update_features): {missing}")
+
+    sql = "SELECT post_id, mask FROM text_features"
+    params = []
+    if post_ids is not None:
+        post_ids = [str(p) for p in post_ids]
+        sql += f" WHERE post_id IN ({', '.join('?' for _ in post_ids)})"
+        params = post_ids
+    stored = pd.read_sql(sql, conn, params=params)
+
+    # re-pack the stored bits into pattern order, then expand
+    masks = stored['mask'].to_numpy()
+    packed = sum(((masks >> bits[name]) & 1) << i for i, name in enumerate(patterns))
+    return unpack_masks(packed, list(patterns), prefix, index=pd.Index(stored['post_id'], name='post_id'))
+
+
+def main():
+    conn = sqlite3.connect(DB_NAME)
+    migrate(conn)
+    counts = update_features(conn)
+    total = conn.execute("SELECT COUNT(*) FROM text_features").fetchone()[0]
+    conn.close()
+    print(f"Feature store: {total} listings; {counts['new']} new, {counts['rescanned']} rescanned, "
+          f"{counts['new_patterns']} scanned for new patterns, {counts['rehashed']} unchanged text, "
+          f"{counts['removed']} removed.")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,269 @@
+"""
+Price model (the notebook's linear regression) kept as sufficient statistics in
+rentals.db, so a refresh folds in only the new listings.
+
+For every scrape date (bucket), model_buckets holds Z'Z, Z'y, y'y and n of the
+design Z = [1, features, missing indicators], with a missing bedrooms, bathrooms
+or sqft stored as 0 plus its indicator. Median imputation is then a linear map
+of Z (column += median * indicator), so the imputed fit is solved from the sums
+for any medians, and the medians come from per-bucket value counts
+(model_histograms) instead of the raw rows. model_rows keeps the values each
+listing was folded in with: a listing that changes or disappears is subtracted
+and re-added; nothing else is read.
+
+Features are the notebook's: bedrooms, bathrooms, sqft (median-imputed),
+avg_median_income, crime_count_2025 and the has_* amenity flags from
+feature_store.py.
+
+    python incremental_model.py                # fold in new listings, print coefficients
+    python incremental_model.py 2025-10-01     # also retire buckets scraped before that date
+"""
+import sqlite3
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from amenities import PATTERNS
+from create_db import migrate
+from feature_store import update_features
+
+DB_NAME = 'rentals.db'
+
+IMPUTED = ['bedrooms', 'bathrooms', 'sqft']             # median-imputed, as in the notebook
+NUMERIC = IMPUTED + ['avg_median_income', 'crime_count_2025']  # the rest are filled with 0
+AMENITIES = list(PATTERNS)
+FEATURES = NUMERIC + [f'has_{name}' for name in AMENITIES]
+DESIGN = ['intercept'] + FEATURES + [f'missing_{col}' for col in IMPUTED]
+
+# columns of model_rows after listing_id and bucket
+ROW_FIELDS = ['price'] + NUMERIC + ['amenity_mask']
+
+
+class ModelFit(NamedTuple):
+    coef: pd.Series              # dollars per unit of each feature
+    intercept: float
+    n: int
+    medians: Dict[str, float]    # imputation values used
+    since: Optional[str]
+    until: Optional[str]
+
+
+def design(rows):
+    """Z and y for rows of ROW_FIELDS (missing imputed columns as 0 + indicator)."""
+    values = np.array([row[:-1] for row in rows], dtype=np.float64).reshape(len(rows), len(ROW_FIELDS) - 1)
+    masks = np.array([row[-1] or 0 for row in rows], dtype=np.int64)
+    y, numeric = values[:, 0], values[:, 1:]
+
+    missing = np.isnan(numeric[:, :len(IMPUTED)])
+    amenities = (masks[:, None] >> np.arange(len(AMENITIES))) & 1
+    Z = np.hstack([np.ones((len(rows), 1)), np.nan_to_num(numeric, nan=0.0), amenities, missing])
+    return Z, y
+
+
+def amenity_mask_sql(conn):
+    """SQL expression packing text_features.mask into AMENITIES order (bit i = AMENITIES[i])."""
+    bits = dict(conn.execute("SELECT name, bit FROM feature_patterns"))
+    return " | ".join(f"(((f.mask >> {bits[name]}) & 1) << {i})" for i, name in enumerate(AMENITIES))
+
+
+def get_setting(conn, name):
+    row = conn.execute("SELECT value FROM model_settings WHERE name = ?", (name,)).fetchone()
+    return row[0] if row else None
+
+
+def apply_rows(conn, rows, sign):
+    """Adds (sign=1) or subtracts (sign=-1) rows of (listing_id, bucket, *ROW_FIELDS) from their buckets."""
+    by_bucket = defaultdict(list)
+    for listing_id, bucket, *fields in rows:
+        by_bucket[bucket].append(fields)
+
+    for bucket, fields in by_bucket.items():
+        Z, y = design(fields)
+        stored = conn.execute("SELECT n, ztz, zty, yty FROM model_buckets WHERE bucket = ?", (bucket,)).fetchone()
+        if stored is None:
+            n, ztz, zty, yty = 0, np.zeros((len(DESIGN), len(DESIGN))), np.zeros(len(DESIGN)), 0.0
+        else:
+            n, ztz, zty, yty = stored[0], np.frombuffer(stored[1]).reshape(len(DESIGN), -1), \
+                np.frombuffer(stored[2]), stored[3]
+
+        n += sign * len(y)
+        if n == 0:
+            conn.execute("DELETE FROM model_buckets WHERE bucket = ?", (bucket,))
+        else:
+            conn.execute(
+                "INSERT OR REPLACE INTO model_buckets VALUES (?, ?, ?, ?, ?)",
+                (bucket, n, (ztz + sign * Z.T @ Z).tobytes(), (zty + sign * Z.T @ y).tobytes(),
+                 yty + sign * float(y @ y)),
+            )
+
+        counts = Counter()
+        for i, col in enumerate(IMPUTED):
+            counts.update((col, float(v)) for v in Z[:, 1 + i][Z[:, DESIGN.index(f'missing_{col}')] == 0])
+        conn.executemany("""
+            INSERT INTO model_histograms VALUES (?, ?, ?, ?)
+            ON CONFLICT(bucket, feature, value) DO UPDATE SET count = count + excluded.count
+        """, [(bucket, col, value, sign * count) for (col, value), count in counts.items()])
+    conn.execute("DELETE FROM model_histograms WHERE count <= 0")
+
+
+def update_model(conn):
+    """
+    Folds new and changed listings of master_data into the model state and
+    takes out removed ones. Returns counts of the rows added and removed.
+    """
+    update_features(conn)
+    retired_before = get_setting(conn, 'retired_before')
+
+    current = f"""
+        SELECT m.id AS listing_id, substr(m.scraped_date, 1, 10) AS bucket,
+               {', '.join(f'm.{col}' for col in ROW_FIELDS[:-1])},
+               {amenity_mask_sql(conn)} AS amenity_mask
+        FROM master_data m
+        LEFT JOIN text_features f ON f.post_id = m.post_id
+        WHERE m.price IS NOT NULL AND substr(m.scraped_date, 1, 10) >= ?
+    """
+    # rows whose folded-in values no longer match (or that are new); compared in SQL, not Python
+    changed = conn.execute(f"""
+        SELECT c.* FROM ({current}) c
+        LEFT JOIN model_rows r ON r.listing_id = c.listing_id
+        WHERE r.listing_id IS NULL OR r.bucket IS NOT c.bucket
+           OR {' OR '.join(f'r.{col} IS NOT c.{col}' for col in ROW_FIELDS)}
+    """, (retired_before or '',)).fetchall()
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS model_changed (listing_id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM model_changed")
+    conn.executemany("INSERT INTO model_changed VALUES (?)", [(row[0],) for row in changed])
+    stale = conn.execute(f"""
+        SELECT r.* FROM model_rows r
+        WHERE r.listing_id IN (SELECT listing_id FROM model_changed)
+           OR r.listing_id NOT IN (SELECT listing_id FROM ({current}))
+    """, (retired_before or '',)).fetchall()
+
+    apply_rows(conn, stale, -1)
+    apply_rows(conn, changed, 1)
+    conn.executemany("DELETE FROM model_rows WHERE listing_id = ?", [(row[0],) for row in stale])
+    conn.executemany(f"INSERT INTO model_rows VALUES ({', '.join('?' for _ in range(len(ROW_FIELDS) + 2))})",
+                     changed)
+    conn.commit()
+    return {'added': len(changed), 'removed': len(stale)}
+
+
+def retire_before(conn, date):
+    """Drops buckets scraped before date (the listings stay in rentals) and keeps them out."""
+    date = str(date)[:10]
+    for table in ('model_rows', 'model_buckets', 'model_histograms'):
+        conn.execute(f"DELETE FROM {table} WHERE bucket < ?", (date,))
+    conn.execute("INSERT OR REPLACE INTO model_settings VALUES ('retired_before', ?)", (date,))
+    conn.commit()
+
+
+def rebuild_model(conn):
+    """Recomputes the whole state from master_data (clears accumulated rounding)."""
+    for table in ('model_rows', 'model_buckets', 'model_histograms'):
+        conn.execute(f"DELETE FROM {table}")
+    return update_model(conn)
+
+
+def bucket_filter(since, until):
+    where, params = [], []
+    if since is not None:
+        where.append("bucket >= ?")
+        params.append(str(since)[:10])
+    if until is not None:
+        where.append("bucket < ?")
+        params.append(str(until)[:10])
+    return (" WHERE " + " AND ".join(where)) if where else "", params
+
+
+def medians(conn, since=None, until=None):
+    """Medians of the imputed columns from the value counts (same as pandas' median)."""
+    where, params = bucket_filter(since, until)
+    counts = pd.read_sql(f"""
+        SELECT feature, value, SUM(count) AS count FROM model_histograms{where}
+        GROUP BY feature, value ORDER BY feature, value
+    """, conn, params=params)
+
+    result = {}
+    for col in IMPUTED:
+        hist = counts[counts['feature'] == col]
+        total = hist['count'].sum()
+        if total == 0:
+            result[col] = 0.0
+            continue
+        cumulative = hist['count'].cumsum().to_numpy()
+        values = hist['value'].to_numpy()
+        # the (total-1)//2-th and total//2-th values in sorted order, averaged
+        low = values[np.searchsorted(cumulative, (total - 1) // 2 + 1)]
+        high = values[np.searchsorted(cumulative, total // 2 + 1)]
+        result[col] = float((low + high) / 2)
+    return result
+
+
+def fit_model(conn, since=None, until=None, missing_indicators=False):
+    """
+    Least-squares fit from the stored sums of the buckets in [since, until),
+    with missing bedrooms/bathrooms/sqft imputed by the window's medians.
+    missing_indicators: also fit a coefficient for each missing_* indicator.
+    """
+    where, params = bucket_filter(since, until)
+    buckets = conn.execute(f"SELECT n, ztz, zty FROM model_buckets{where}", params).fetchall()
+    if not buckets:
+        raise ValueError("no listings in the model for this window; run update_model first")
+    n = sum(b[0] for b in buckets)
+    ztz = sum(np.frombuffer(b[1]).reshape(len(DESIGN), -1) for b in buckets)
+    zty = sum(np.frombuffer(b[2]) for b in buckets)
+
+    # imputation: Z_imputed = Z @ A, where A adds median * indicator to each imputed column
+    imputed = medians(conn, since, until)
+    A = np.eye(len(DESIGN))
+    for col in IMPUTED:
+        A[DESIGN.index(f'missing_{col}'), DESIGN.index(col)] = imputed[col]
+    ztz, zty = A.T @ ztz @ A, A.T @ zty
+
+    columns = DESIGN if missing_indicators else DESIGN[:1 + len(FEATURES)]
+    keep = [DESIGN.index(col) for col in columns]
+    ztz, zty = ztz[np.ix_(keep, keep)], zty[keep]
+
+    # scale to unit diagonal before solving (sqft and income dwarf the 0/1 flags)
+    scale = np.sqrt(np.diag(ztz))
+    scale[scale == 0] = 1.0
+    w = np.linalg.lstsq(ztz / np.outer(scale, scale), zty / scale, rcond=None)[0] / scale
+    return ModelFit(pd.Series(w[1:], index=columns[1:]), float(w[0]), n, imputed, since, until)
+
+
+def predict(fit, df):
+    """Predicted prices for a DataFrame with the FEATURES columns."""
+    X = df[FEATURES].astype(float).copy()
+    for col in IMPUTED:
+        if f'missing_{col}' in fit.coef.index:
+            X[f'missing_{col}'] = X[col].isna().astype(float)
+        X[col] = X[col].fillna(fit.medians[col])
+    X = X.fillna(0)
+    return fit.intercept + X[fit.coef.index].to_numpy() @ fit.coef.to_numpy()
+
+
+def main():
+    conn = sqlite3.connect(DB_NAME)
+    migrate(conn)
+    if len(sys.argv) > 1:
+        retire_before(conn, sys.argv[1])
+        print(f"Retired listings scraped before {sys.argv[1]}.")
+
+    start = time.perf_counter()
+    counts = update_model(conn)
+    fit = fit_model(conn)
+    elapsed = time.perf_counter() - start
+    conn.close()
+
+    print(f"Folded in {counts['added']} listings, took out {counts['removed']} "
+          f"({fit.n} in the model) in {elapsed:.2f}s.")
+    print(f"Intercept: {fit.intercept:,.0f}")
+    for name, value in fit.coef.items():
+        print(f"  {name:<20} {value:>12,.2f}")
+
+
+if __name__ == '__main__':
+    main()
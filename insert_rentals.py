@@ -1,32 +1,86 @@
 import pandas as pd
+import hashlib
 import sqlite3
-import os
-import re
+import time
+
+from create_db import migrate
 
 # config
 DB_NAME = 'rentals.db'
 CSV_PATH = 'rentals.csv'
+BATCH_SIZE = 5000
+CHUNK_SIZE = 10000  # rows read from the CSV at a time
+
+# "incremental" only writes new/changed listings and keeps price history,
+# "bulk" upserts every row
+LOAD_MODE = 'incremental'
+
+INSERT_COLUMNS = [
+    'post_id',
+    'price',
+    'bedrooms',
+    'bathrooms',
+    'sqft',
+    'zip_code',
+    'neighborhood',
+    'full_description',
+]
+
+# every row carries a hash of its content so unchanged listings can be skipped
+ROW_COLUMNS = INSERT_COLUMNS + ['content_hash']
+
+# new listings are inserted; a re-scraped post_id keeps its row (and id) and is updated
+UPSERT_SQL = f"""
+    INSERT INTO rentals ({', '.join(ROW_COLUMNS)})
+    VALUES ({', '.join('?' for _ in ROW_COLUMNS)})
+    ON CONFLICT(post_id) DO UPDATE SET
+        {', '.join(f'{col} = excluded.{col}' for col in ROW_COLUMNS[1:])}
+"""
+
+STAGE_SQL = f"""
+    INSERT OR REPLACE INTO stage_rentals ({', '.join(ROW_COLUMNS)})
+    VALUES ({', '.join('?' for _ in ROW_COLUMNS)})
+"""
 
 # existed funcs modified
-def clean_zip_code(zip_code_str):
-    """Cleans and validates the zip code field."""
-    if pd.isna(zip_code_str):
-        return None
-    # Assuming the zip code is the last 5 digits if it's not a clear string
-    match = re.search(r'(\d{5})', str(zip_code_str))
-    return match.group(1) if match else None
-
-def insert_data_into_db(df):
+def clean_zip_codes(zip_codes):
+    """Cleans and validates a whole zip code column with vectorized string ops."""
+    # Assuming the zip code is the first 5-digit run if it's not a clear string
+    return zip_codes.astype('string').str.extract(r'(\d{5})', expand=False)
+
+
+def read_rentals_csv(path=CSV_PATH, chunk_size=CHUNK_SIZE):
     """
-    Connects to SQLite and performs row-by-row insertion using 
-    'INSERT OR REPLACE' to prevent crashing on duplicate listings.
+    Streams the scraped CSV in fixed-size chunks with zip codes already
+    cleaned, so memory stays flat however many listings the file holds.
     """
+    for chunk in pd.read_csv(path, chunksize=chunk_size):
+        chunk['zip code'] = clean_zip_codes(chunk['zip code'])
+        yield chunk
 
-    print(f"\nAttempting to insert {len(df)} records into {DB_NAME}.")
-    con = sqlite3.connect(DB_NAME)
-    cur = con.cursor()
+
+def configure_connection(con):
+    """Tunes SQLite for bulk loading."""
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=NORMAL")
+    con.execute("PRAGMA cache_size=-65536")  # 64 MB page cache
+    con.execute("PRAGMA temp_store=MEMORY")
+
+
+def content_hash(values):
+    """
+    Stable hash of one listing's column values. Whole floats are hashed as ints
+    so a price read as 3250.0 in one chunk and 3250 in another hashes the same.
+    """
+    canonical = [int(v) if isinstance(v, float) and v.is_integer() else v for v in values]
+    return hashlib.blake2b(repr(canonical).encode('utf-8'), digest_size=16).hexdigest()
 
 
+def prepare_rows(df):
+    """
+    Maps the scraped DataFrame columns to the database schema and returns the
+    rows as plain tuples (NaN -> None) in ROW_COLUMNS order.
+    """
     # Map the DataFrame columns to the database schema
     df_to_insert = df.rename(columns={
         'pid': 'post_id',
@@ -37,61 +91,205 @@ def insert_data_into_db(df):
     })
     # Final preparation (ensure required columns exist and are correct types)
     df_to_insert = df_to_insert.dropna(subset=['post_id', 'price'])
+    # pids read back as floats when the column had gaps; keep them as plain digits
+    if pd.api.types.is_float_dtype(df_to_insert['post_id']):
+        df_to_insert['post_id'] = df_to_insert['post_id'].astype('int64')
+    df_to_insert['post_id'] = df_to_insert['post_id'].astype(str)
+
+    values = df_to_insert.reindex(columns=INSERT_COLUMNS).astype(object)
+    values = values.where(values.notna(), None)
+    rows = [row + (content_hash(row[1:]),) for row in values.itertuples(index=False, name=None)]
+    return df_to_insert, rows
+
+
+def insert_batch(con, rows, failures, sql=UPSERT_SQL):
+    """
+    Inserts one batch with executemany inside a savepoint. If any row fails, the
+    batch is rolled back and retried row by row so only the bad rows are skipped.
+    """
+    cur = con.cursor()
+    cur.execute("SAVEPOINT batch")
+    try:
+        cur.executemany(sql, rows)
+        inserted = len(rows)
+    except sqlite3.Error:
+        cur.execute("ROLLBACK TO batch")
+        inserted = 0
+        for row in rows:
+            try:
+                cur.execute(sql, row)
+                inserted += 1
+            except sqlite3.Error as e:
+                failures.append((row[0], str(e)))
+    cur.execute("RELEASE batch")
+    return inserted
+
+
+def apply_incremental(con, rows, failures):
+    """
+    Applies only the delta of one chunk: unchanged listings (same content hash)
+    aren't touched, changed listings are rewritten by a single UPDATE, price
+    changes are appended to rentals_history, and unseen post_ids are inserted.
+    Returns (new, changed, unchanged) counts.
+    """
+    # compare hashes first, so unchanged rows never have their text staged
+    con.execute("DELETE FROM stage_keys")
+    con.executemany(
+        "INSERT OR REPLACE INTO stage_keys (post_id, content_hash) VALUES (?, ?)",
+        [(row[0], row[-1]) for row in rows],
+    )
+    seen = con.execute("SELECT COUNT(*) FROM stage_keys").fetchone()[0]
+    delta = dict(con.execute("""
+        SELECT k.post_id, r.post_id IS NOT NULL
+        FROM stage_keys k LEFT JOIN rentals r ON r.post_id = k.post_id
+        WHERE r.content_hash IS NOT k.content_hash
+    """).fetchall())
+    changed = sum(delta.values())
+    new = len(delta) - changed
+    if not delta:
+        return 0, 0, seen
+
+    # a post_id repeated within the chunk keeps its last row
+    con.execute("DELETE FROM stage_rentals")
+    insert_batch(con, [row for row in rows if row[0] in delta], failures, sql=STAGE_SQL)
+
+    with con:
+        con.execute("""
+            INSERT INTO rentals_history (post_id, old_price, new_price)
+            SELECT r.post_id, r.price, s.price
+            FROM stage_rentals s JOIN rentals r ON r.post_id = s.post_id
+            WHERE r.price IS NOT s.price
+        """)
 
-    print("Count non-null:", df_to_insert['neighborhood'].notna().sum())
-    print("Count null:", df_to_insert['neighborhood'].isna().sum())
-
-    # iterate through the DataFrame and apply the SQL fix to each row
-    for index, row in df_to_insert.iterrows():
-        try:
-            cur.execute("""
-                        INSERT
-                        OR REPLACE INTO rentals (
-                    post_id,
-                    price,
-                    bedrooms,
-                    bathrooms,
-                    sqft,
-                    zip_code,
-                    neighborhood,
-                    full_description
-                )
-                VALUES (
-                    :post_id,
-                    :price,
-                    :bedrooms,
-                    :bathrooms,
-                    :sqft,
-                    :zip_code,
-                    :neighborhood,
-                    :full_description
-                )
-                        """, {
-                            "post_id": row["post_id"],
-                            "price": row["price"],
-                            "bedrooms": row["bedrooms"],
-                            "bathrooms": row["bathrooms"],
-                            "sqft": row["sqft"],
-                            "zip_code": row["zip_code"],
-                            "neighborhood": row["neighborhood"],
-                            "full_description": row["full_description"],
-                        })
-
-
-        except Exception as e:
-            # If the error is not the UNIQUE constraint
-            print(f"ERROR: Failed to insert PID {row['post_id']} due to: {e}")
-
-    con.commit()
+        # one statement for every column, so the master_data trigger rebuilds a changed
+        # listing once; new post_ids aren't in rentals yet and are inserted below
+        con.execute(f"""
+            UPDATE rentals SET {', '.join(f'{col} = s.{col}' for col in ROW_COLUMNS[1:])},
+                scraped_date = CURRENT_TIMESTAMP
+            FROM stage_rentals s
+            WHERE s.post_id = rentals.post_id AND rentals.content_hash IS NOT s.content_hash
+        """)
+
+        con.execute(f"""
+            INSERT INTO rentals ({', '.join(ROW_COLUMNS)})
+            SELECT {', '.join(ROW_COLUMNS)} FROM stage_rentals s
+            WHERE NOT EXISTS (SELECT 1 FROM rentals r WHERE r.post_id = s.post_id)
+        """)
+
+    return new, changed, seen - len(delta)
+
+
+def load_chunks_incremental(chunks):
+    """
+    Incremental counterpart of load_chunks: write volume scales with the number
+    of new and changed listings instead of the size of the file.
+    """
+    con = sqlite3.connect(DB_NAME)
+    configure_connection(con)
+    migrate(con)
+    con.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS stage_keys (
+            post_id TEXT PRIMARY KEY,
+            content_hash TEXT
+        )
+    """)
+    con.execute("""
+        CREATE TEMP TABLE IF NOT EXISTS stage_rentals (
+            post_id TEXT PRIMARY KEY,
+            price INTEGER,
+            bedrooms REAL,
+            bathrooms REAL,
+            sqft INTEGER,
+            zip_code TEXT,
+            neighborhood TEXT,
+            full_description TEXT,
+            content_hash TEXT
+        )
+    """)
+
+    start_time = time.perf_counter()
+    failures = []
+    totals = {"new": 0, "changed": 0, "unchanged": 0}
+
+    for chunk in chunks:
+        _, rows = prepare_rows(chunk)
+        new, changed, unchanged = apply_incremental(con, rows, failures)
+        totals["new"] += new
+        totals["changed"] += changed
+        totals["unchanged"] += unchanged
+        print(f"  {totals['new']} new, {totals['changed']} changed, {totals['unchanged']} unchanged so far")
+
+    elapsed = time.perf_counter() - start_time
     con.close()
 
-    print(f"Insertion complete. Database is updated.")
+    for post_id, error in failures[:20]:
+        print(f"ERROR: Failed to stage PID {post_id} due to: {error}")
+
+    seen = sum(totals.values())
+    rate = seen / elapsed if elapsed > 0 else float('inf')
+    print(
+        f"Incremental load complete in {elapsed:.2f}s ({rate:,.0f} rows/sec): "
+        f"{totals['new']} new, {totals['changed']} changed, {totals['unchanged']} unchanged, {len(failures)} failed."
+    )
+    totals.update({"failures": failures, "seconds": elapsed})
+    return totals
 
-def main():
-    df_merged = pd.read_csv(CSV_PATH)
 
-    df_merged['zip code'] = df_merged['zip code'].apply(clean_zip_code)
-    insert_data_into_db(df_merged)
+def load_chunks(chunks, batch_size=BATCH_SIZE):
+    """
+    Bulk-loads listings chunk by chunk with executemany in batched
+    transactions; each chunk is written before the next one is read. Existing
+    post_ids are updated in place (ON CONFLICT DO UPDATE). Failed rows are
+    collected and reported instead of aborting the load.
+    """
+    con = sqlite3.connect(DB_NAME)
+    configure_connection(con)
+    migrate(con)
+
+    start_time = time.perf_counter()
+    failures = []
+    inserted = 0
+    hood_non_null = hood_null = 0
+
+    for chunk in chunks:
+        df_to_insert, rows = prepare_rows(chunk)
+        hood_non_null += df_to_insert['neighborhood'].notna().sum()
+        hood_null += df_to_insert['neighborhood'].isna().sum()
+
+        for i in range(0, len(rows), batch_size):
+            inserted += insert_batch(con, rows[i:i + batch_size], failures)
+            con.commit()
+        print(f"  loaded {inserted} rows so far")
+
+    elapsed = time.perf_counter() - start_time
+    con.close()
+
+    print("Count non-null:", hood_non_null)
+    print("Count null:", hood_null)
+
+    for post_id, error in failures[:20]:
+        print(f"ERROR: Failed to insert PID {post_id} due to: {error}")
+    if len(failures) > 20:
+        print(f"... and {len(failures) - 20} more failed rows")
+
+    rate = inserted / elapsed if elapsed > 0 else float('inf')
+    print(f"Insertion complete. {inserted} rows in {elapsed:.2f}s ({rate:,.0f} rows/sec), {len(failures)} failed.")
+    return {"inserted": inserted, "failures": failures, "seconds": elapsed}
+
+
+def insert_data_into_db(df, batch_size=BATCH_SIZE):
+    """Loads an in-memory DataFrame; see load_chunks."""
+    print(f"\nAttempting to insert {len(df)} records into {DB_NAME}.")
+    return load_chunks([df], batch_size)
+
+
+def main():
+    print(f"\nStreaming {CSV_PATH} into {DB_NAME} in chunks of {CHUNK_SIZE} rows ({LOAD_MODE} mode).")
+    chunks = read_rentals_csv(CSV_PATH, CHUNK_SIZE)
+    if LOAD_MODE == 'incremental':
+        load_chunks_incremental(chunks)
+    else:
+        load_chunks(chunks)
 
 
 if __name__ == '__main__':
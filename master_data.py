@@ -0,0 +1,90 @@
+"""
+Loader for the master dataset: every listing joined with its zip code's
+neighborhood data.
+
+The join is materialized in the master_data table of rentals.db (migration 6 in
+create_db.py) and kept current by triggers on rentals and neighborhood_data, so
+a new listing is in the master set as soon as it is inserted, and a refreshed
+zip code only rewrites its own rows. Nothing is rejoined on load.
+
+    python master_data.py                  # summary of the master set
+    python master_data.py master_data.csv  # export it to CSV, as Data_Join.ipynb did
+"""
+import sqlite3
+import sys
+
+import pandas as pd
+
+from create_db import MASTER_NEIGHBORHOOD_COLUMNS, MASTER_RENTAL_COLUMNS, MASTER_SELECT, migrate
+
+DB_NAME = 'rentals.db'
+
+MASTER_COLUMNS = MASTER_RENTAL_COLUMNS + MASTER_NEIGHBORHOOD_COLUMNS
+
+
+def load_master_data(db_path=DB_NAME, columns=None, since=None, zip_codes=None, include_description=True,
+                     distinct_units=False):
+    """
+    Returns the master dataset as a DataFrame, in the column order of master_data.csv.
+
+    columns:             subset of MASTER_COLUMNS to read (default: all)
+    since:               only listings scraped at or after this date ('2025-11-01')
+    zip_codes:           only listings in these zip codes
+    include_description: False skips full_description, by far the widest column
+    distinct_units:      drop reposts, keeping the earliest listing of each unit (see dedup.py)
+    """
+    columns = list(columns or MASTER_COLUMNS)
+    unknown = [col for col in columns if col not in MASTER_COLUMNS]
+    if unknown:
+        raise ValueError(f"unknown master_data columns: {unknown}")
+    if not include_description and 'full_description' in columns:
+        columns.remove('full_description')
+
+    where, params = [], []
+    if since is not None:
+        where.append("scraped_date >= ?")
+        params.append(str(since))
+    if zip_codes is not None:
+        zip_codes = [str(z) for z in zip_codes]
+        where.append(f"zip_code IN ({', '.join('?' for _ in zip_codes)})")
+        params.extend(zip_codes)
+    if distinct_units:
+        where.append("id NOT IN (SELECT id FROM rentals WHERE canonical_listing_id != id)")
+
+    sql = f"SELECT {', '.join(columns)} FROM master_data"
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " ORDER BY id"
+
+    with sqlite3.connect(db_path) as conn:
+        migrate(conn)
+        return pd.read_sql(sql, conn, params=params)
+
+
+def rebuild_master_data(conn):
+    """Full rejoin of master_data, for when the triggers were bypassed (e.g. a restored backup)."""
+    conn.execute("DELETE FROM master_data")
+    conn.execute("INSERT OR REPLACE INTO master_data " + MASTER_SELECT.format(where="1"))
+    conn.commit()
+
+
+def check_master_data(conn):
+    """
+    Compares master_data with a fresh join. Returns the ids that are missing,
+    extra or different (all empty when the triggers kept it current).
+    """
+    fresh = pd.read_sql(MASTER_SELECT.format(where="1"), conn).set_index('id').sort_index()
+    stored = pd.read_sql("SELECT * FROM master_data", conn).set_index('id').sort_index()
+    missing = fresh.index.difference(stored.index)
+    extra = stored.index.difference(fresh.index)
+    shared = fresh.index.intersection(stored.index)
+    differs = fresh.loc[shared].compare(stored.loc[shared][fresh.columns]).index
+    return {'missing': list(missing), 'extra': list(extra), 'different': list(differs)}
+
+
+if __name__ == '__main__':
+    master_df = load_master_data()
+    print(f"master_data: {len(master_df)} listings in {master_df['zip_code'].nunique()} zip codes")
+    if len(sys.argv) > 1:
+        master_df.to_csv(sys.argv[1], index=False)
+        print(f"Exported to {sys.argv[1]}")
@@ -0,0 +1,158 @@
+"""
+Columnar export of the master dataset, for notebooks that only need a few columns.
+
+The export is a directory of two Parquet files:
+
+    master_data_parquet/master.parquet        every column except the description,
+                                              sorted by zip code and scraped date
+    master_data_parquet/descriptions.parquet  id + full_description (zstd)
+
+zip_code and neighborhood are dictionary-encoded (pandas category), integer
+columns are downcast, and bedrooms/bathrooms/sqft are stored as float32 (halves
+and whole square feet are exact). Reading is memory-mapped, only the requested
+columns are decoded, and row filters are checked against row-group statistics
+first, so filtered reads skip whole row groups.
+
+    python master_export.py                   # export from rentals.db
+    python master_export.py master_data.csv   # export from the CSV and compare load times
+"""
+import os
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from master_data import MASTER_COLUMNS, load_master_data
+
+EXPORT_DIR = 'master_data_parquet'
+MASTER_FILE = 'master.parquet'
+DESCRIPTIONS_FILE = 'descriptions.parquet'
+ROW_GROUP_SIZE = 2048  # small groups so zip code / date filters can skip most of them
+
+# storage type of every non-description column
+MASTER_SCHEMA = pa.schema([
+    ('id', pa.int32()),
+    ('post_id', pa.int64()),
+    ('price', pa.int32()),
+    ('bedrooms', pa.float32()),
+    ('bathrooms', pa.float32()),
+    ('sqft', pa.float32()),
+    ('zip_code', pa.dictionary(pa.int16(), pa.string())),
+    ('neighborhood', pa.dictionary(pa.int16(), pa.string())),
+    ('scraped_date', pa.timestamp('s')),
+    ('avg_median_income', pa.float64()),
+    ('crime_count_2025', pa.int32()),
+    ('population_2025', pa.int32()),
+])
+
+DESCRIPTIONS_SCHEMA = pa.schema([
+    ('id', pa.int32()),
+    ('full_description', pa.string()),
+])
+
+
+def to_master_table(master_df):
+    """Converts the master DataFrame to the export schema (without descriptions)."""
+    df = master_df[[field.name for field in MASTER_SCHEMA]].copy()
+    df['post_id'] = pd.to_numeric(df['post_id'])
+    df['zip_code'] = df['zip_code'].astype(str).str.zfill(5)
+    df['scraped_date'] = pd.to_datetime(df['scraped_date'])
+    # zip code first so each row group covers few zip codes
+    df = df.sort_values(['zip_code', 'scraped_date'], kind='stable')
+    return pa.Table.from_pandas(df, schema=MASTER_SCHEMA, preserve_index=False)
+
+
+def export_master_data(master_df=None, out_dir=EXPORT_DIR):
+    """
+    Writes the columnar export of master_df (default: the master_data table).
+    Returns the sizes in bytes of the two files.
+    """
+    if master_df is None:
+        master_df = load_master_data()
+    os.makedirs(out_dir, exist_ok=True)
+
+    master_path = os.path.join(out_dir, MASTER_FILE)
+    pq.write_table(to_master_table(master_df), master_path, row_group_size=ROW_GROUP_SIZE,
+                   compression='snappy', write_statistics=True)
+
+    descriptions = pa.Table.from_pandas(master_df[['id', 'full_description']],
+                                        schema=DESCRIPTIONS_SCHEMA, preserve_index=False)
+    descriptions_path = os.path.join(out_dir, DESCRIPTIONS_FILE)
+    pq.write_table(descriptions, descriptions_path, compression='zstd')
+
+    return {MASTER_FILE: os.path.getsize(master_path), DESCRIPTIONS_FILE: os.path.getsize(descriptions_path)}
+
+
+def load_master_export(columns=None, filters=None, include_description=False, export_dir=EXPORT_DIR):
+    """
+    Reads the export back as a DataFrame.
+
+    columns:             subset of MASTER_COLUMNS (default: all but full_description)
+    filters:             pyarrow row filters on non-description columns, e.g.
+                         [('zip_code', 'in', ['94110', '94103']), ('price', '<', 4000)]
+    include_description: also read full_description (joined on id)
+    """
+    columns = list(columns or [field.name for field in MASTER_SCHEMA])
+    unknown = [col for col in columns if col not in MASTER_COLUMNS]
+    if unknown:
+        raise ValueError(f"unknown master_data columns: {unknown}")
+
+    want_description = include_description or 'full_description' in columns
+    columns = [col for col in columns if col != 'full_description']
+    read_columns = columns if not want_description or 'id' in columns else columns + ['id']
+
+    master_df = pq.read_table(
+        os.path.join(export_dir, MASTER_FILE),
+        columns=read_columns,
+        filters=filters,
+        memory_map=True,
+    ).to_pandas()
+
+    if want_description:
+        descriptions = pq.read_table(
+            os.path.join(export_dir, DESCRIPTIONS_FILE),
+            filters=[('id', 'in', master_df['id'].tolist())] if filters else None,
+            memory_map=True,
+        ).to_pandas()
+        master_df = master_df.merge(descriptions, on='id', how='left')
+        if 'id' not in columns:
+            master_df = master_df.drop(columns='id')
+        # same column order as master_data.csv
+        master_df = master_df[[col for col in MASTER_COLUMNS if col in master_df.columns]]
+
+    return master_df
+
+
+def compare_with_csv(csv_path, export_dir=EXPORT_DIR):
+    """Times and sizes a CSV load against column-pruned and filtered export loads."""
+    def timed(load):
+        start = time.perf_counter()
+        df = load()
+        return df, time.perf_counter() - start
+
+    csv_df, csv_seconds = timed(lambda: pd.read_csv(csv_path))
+    numeric = ['price', 'bedrooms', 'bathrooms', 'sqft', 'zip_code',
+               'avg_median_income', 'crime_count_2025', 'population_2025']
+    cases = [
+        ("csv, all columns", csv_df, csv_seconds),
+        ("export, all columns", *timed(lambda: load_master_export(include_description=True, export_dir=export_dir))),
+        ("export, numeric columns", *timed(lambda: load_master_export(numeric, export_dir=export_dir))),
+        ("export, numeric, one zip", *timed(lambda: load_master_export(
+            numeric, filters=[('zip_code', '=', '94110')], export_dir=export_dir))),
+    ]
+    for name, df, seconds in cases:
+        memory = df.memory_usage(deep=True).sum() / 1024 ** 2
+        print(f"  {name:<26} {seconds * 1000:7.1f} ms  {len(df):6} rows  {memory:6.2f} MB in memory")
+
+
+if __name__ == '__main__':
+    source = sys.argv[1] if len(sys.argv) > 1 else None
+    master_df = pd.read_csv(source, dtype={'zip_code': str}) if source else load_master_data()
+    sizes = export_master_data(master_df)
+    for name, size in sizes.items():
+        print(f"Wrote {os.path.join(EXPORT_DIR, name)} ({size / 1024:.0f} KB)")
+    if source:
+        print(f"Loading {source} ({os.path.getsize(source) / 1024:.0f} KB) vs the export:")
+        compare_with_csv(source)
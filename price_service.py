@@ -0,0 +1,225 @@
+"""
+Local rent-estimate service: price a listing from its description, size and zip
+code without re-running the notebook.
+
+At startup the model coefficients (incremental_model.fit_model, from the stored
+sums in rentals.db), the neighborhood_data lookup by zip code and the compiled
+amenity matcher are loaded once. A request is a listing or a list of them:
+
+    {"description": "...", "bedrooms": 2, "bathrooms": 1, "sqft": 850, "zip_code": "94110"}
+
+and each gets {"estimate", "amenities", "zip_code", "zip_known"}. A list is
+scored as one batch (one matrix product). Results are kept in an LRU cache keyed
+by the normalized inputs, so repeated listings aren't scanned again. Missing
+bedrooms/bathrooms/sqft are imputed with the model's medians; an unknown zip
+code gets the citywide average of income and crime (zip_known: false).
+
+    python price_service.py serve [port]       # POST /estimate, GET /health on 127.0.0.1
+    python price_service.py < listings.jsonl   # one JSON listing per line in, one estimate per line out
+"""
+import json
+import math
+import re
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from amenities import PATTERNS, compile_patterns, scan
+from create_db import migrate
+from incremental_model import AMENITIES, FEATURES, IMPUTED, fit_model, update_model
+
+DB_NAME = 'rentals.db'
+PORT = 8141
+CACHE_SIZE = 100_000
+BATCH_SIZE = 1000  # stdin lines scored together
+
+# columns of the feature matrix built for a batch (the model uses a subset)
+COLUMNS = FEATURES + [f'missing_{col}' for col in IMPUTED]
+NEIGHBORHOOD_COLUMNS = slice(COLUMNS.index('avg_median_income'), COLUMNS.index('crime_count_2025') + 1)
+AMENITY_COLUMNS = slice(COLUMNS.index(f'has_{AMENITIES[0]}'), COLUMNS.index(f'has_{AMENITIES[-1]}') + 1)
+ZIP = re.compile(r'(\d{5})')
+
+
+def listing_key(listing):
+    """Normalized inputs: listings that only differ in formatting share a cache entry."""
+    def number(name):
+        value = listing.get(name)
+        if value is None or value == '':
+            return None
+        value = float(value)
+        # nan/inf would come back as a NaN estimate, which isn't valid JSON
+        if not math.isfinite(value) or value < 0:
+            raise ValueError(f"{name} must be a finite, non-negative number, got {listing.get(name)!r}")
+        return value
+
+    match = ZIP.search(str(listing.get('zip_code') or ''))
+    return (listing.get('description') or '', number('bedrooms'), number('bathrooms'), number('sqft'),
+            match.group(1) if match else None)
+
+
+class PriceEstimator:
+
+    def __init__(self, fit, neighborhoods, patterns=PATTERNS, cache_size=CACHE_SIZE):
+        """
+        fit:           incremental_model.ModelFit
+        neighborhoods: {zip_code: (avg_median_income, crime_count_2025)}
+        """
+        self.fit = fit
+        self.neighborhoods = neighborhoods
+        self.citywide = tuple(np.mean(list(neighborhoods.values()), axis=0)) if neighborhoods else (0.0, 0.0)
+        self.matcher = compile_patterns(patterns)
+        self.model_columns = [COLUMNS.index(col) for col in fit.coef.index]
+        self.coef = fit.coef.to_numpy()
+
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+        self.hits = self.misses = 0
+        # the HTTP server answers on several threads
+        self.lock = threading.Lock()
+
+    def score(self, keys):
+        """Estimates for normalized listings, as one matrix product."""
+        X = np.zeros((len(keys), len(COLUMNS)))
+        masks = []
+        for i, (description, bedrooms, bathrooms, sqft, zip_code) in enumerate(keys):
+            for col, value in zip(IMPUTED, (bedrooms, bathrooms, sqft)):
+                if value is None:
+                    X[i, COLUMNS.index(col)] = self.fit.medians[col]
+                    X[i, COLUMNS.index(f'missing_{col}')] = 1
+                else:
+                    X[i, COLUMNS.index(col)] = value
+            X[i, NEIGHBORHOOD_COLUMNS] = self.neighborhoods.get(zip_code, self.citywide)
+            mask = scan(self.matcher, description)
+            X[i, AMENITY_COLUMNS] = [(mask >> bit) & 1 for bit in range(len(AMENITIES))]
+            masks.append(mask)
+
+        prices = self.fit.intercept + X[:, self.model_columns] @ self.coef
+        return [{
+            'estimate': round(float(price), 2),
+            'amenities': [name for bit, name in enumerate(AMENITIES) if mask >> bit & 1],
+            'zip_code': key[4],
+            'zip_known': key[4] in self.neighborhoods,
+        } for key, price, mask in zip(keys, prices, masks)]
+
+    def estimate_batch(self, listings):
+        keys = [listing_key(listing) for listing in listings]
+        results = [None] * len(keys)
+        missing = {}
+        with self.lock:
+            for i, key in enumerate(keys):
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    results[i] = self.cache[key]
+                    self.hits += 1
+                else:
+                    missing.setdefault(key, []).append(i)
+            self.misses += len(missing)
+
+        if missing:
+            for key, result in zip(missing, self.score(list(missing))):
+                for i in missing[key]:
+                    results[i] = result
+                with self.lock:
+                    self.cache[key] = result
+                    if len(self.cache) > self.cache_size:
+                        self.cache.popitem(last=False)
+        return results
+
+    def estimate(self, listing):
+        return self.estimate_batch([listing])[0]
+
+
+def load_estimator(db_path=DB_NAME, cache_size=CACHE_SIZE):
+    """Builds the estimator from rentals.db (folding in new listings first if the model is empty)."""
+    conn = sqlite3.connect(db_path)
+    migrate(conn)
+    try:
+        fit = fit_model(conn)
+    except ValueError:
+        update_model(conn)
+        fit = fit_model(conn)
+    neighborhoods = {zip_code: (income or 0.0, crime or 0.0) for zip_code, income, crime in conn.execute(
+        "SELECT zip_code, avg_median_income, crime_count_2025 FROM neighborhood_data")}
+    conn.close()
+    return PriceEstimator(fit, neighborhoods, cache_size=cache_size)
+
+
+class EstimateHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # headers and body go out as separate writes; with Nagle on, keep-alive clients
+    # wait ~40 ms for the delayed ACK on every request
+    disable_nagle_algorithm = True
+
+    estimator: PriceEstimator = None
+
+    def send_json(self, status, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/health":
+            self.send_json(404, {"error": f"no route {self.path}"})
+            return
+        estimator = self.estimator
+        self.send_json(200, {"listings_in_model": estimator.fit.n, "cached": len(estimator.cache),
+                             "hits": estimator.hits, "misses": estimator.misses})
+
+    def do_POST(self):
+        if self.path != "/estimate":
+            self.send_json(404, {"error": f"no route {self.path}"})
+            return
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+            listings = payload if isinstance(payload, list) else [payload]
+            results = self.estimator.estimate_batch(listings)
+        except (ValueError, TypeError, AttributeError) as e:
+            self.send_json(400, {"error": str(e)})
+            return
+        self.send_json(200, results if isinstance(payload, list) else results[0])
+
+    def log_message(self, format, *args):
+        # silence the per-request access log
+        pass
+
+
+def make_server(estimator, port=PORT):
+    handler = type("Handler", (EstimateHandler,), {"estimator": estimator})
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+def serve_in_background(estimator, port=0):
+    """Starts the service on a daemon thread. Returns the server; call server.shutdown() when done."""
+    server = make_server(estimator, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def score_lines(estimator, lines, out=sys.stdout, batch_size=BATCH_SIZE):
+    """Scores JSON lines in batches and writes one JSON estimate per line."""
+    batch = []
+    for line in lines:
+        if line.strip():
+            batch.append(json.loads(line))
+        if len(batch) == batch_size:
+            out.writelines(json.dumps(result) + "\n" for result in estimator.estimate_batch(batch))
+            batch = []
+    if batch:
+        out.writelines(json.dumps(result) + "\n" for result in estimator.estimate_batch(batch))
+
+
+if __name__ == '__main__':
+    estimator = load_estimator()
+    if sys.argv[1:2] == ['serve']:
+        port = int(sys.argv[2]) if len(sys.argv) > 2 else PORT
+        print(f"Serving estimates from {estimator.fit.n} listings on http://127.0.0.1:{port}/estimate")
+        make_server(estimator, port).serve_forever()
+    else:
+        score_lines(estimator, sys.stdin)
@@ -0,0 +1,226 @@
+import asyncio
+import random
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+from urllib.parse import urlsplit
+
+import aiohttp
+from tqdm import tqdm
+
+from page_cache import PageCache
+
+# statuses worth retrying (throttling and transient server errors)
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Token-bucket rate limiter. Allows bursts of up to `capacity` requests,
+    then refills at `rate` tokens per second.
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                # sleep just long enough for the next token to arrive
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class FetchError(Exception):
+    """Raised when a URL still fails after all retries."""
+
+
+class AsyncFetcher:
+    """
+    Asyncio HTTP client with a per-host concurrency limit, per-host token-bucket
+    rate limiting, request timeouts and exponential-backoff retries.
+
+    Use as an async context manager:
+
+        async with AsyncFetcher(per_host_limit=8, rate=10) as fetcher:
+            text = await fetcher.fetch(url)
+    """
+
+    def __init__(
+        self,
+        per_host_limit: int = 8,
+        rate: float = 10.0,
+        burst: float = 20.0,
+        timeout: float = 15.0,
+        max_retries: int = 4,
+        backoff_base: float = 0.5,
+        backoff_cap: float = 30.0,
+        user_agents: Optional[List[str]] = None,
+        cache: Optional[PageCache] = None,
+    ):
+        self.per_host_limit = per_host_limit
+        self.rate = rate
+        self.burst = burst
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.user_agents = user_agents or []
+        self.cache = cache
+
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.host_limits: Dict[str, asyncio.Semaphore] = {}
+        self.host_buckets: Dict[str, TokenBucket] = {}
+
+        # simple counters for reporting throughput
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "bytes": 0, "cache_hits": 0, "not_modified": 0}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=0, limit_per_host=self.per_host_limit)
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=self.timeout),
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.session.close()
+
+    def _host_state(self, url: str):
+        host = urlsplit(url).netloc
+        if host not in self.host_limits:
+            self.host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+            self.host_buckets[host] = TokenBucket(self.rate, self.burst)
+        return self.host_limits[host], self.host_buckets[host]
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        # honour the server's Retry-After header when it gives one in seconds
+        if retry_after and retry_after.isdigit():
+            return min(self.backoff_cap, float(retry_after))
+
+        # full jitter so throttled workers don't retry in lockstep
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def _headers(self) -> Dict[str, str]:
+        if not self.user_agents:
+            return {}
+        return {"User-Agent": random.choice(self.user_agents)}
+
+    async def fetch(self, url: str) -> str:
+        """
+        Downloads one page and returns its text. Non-retryable statuses (e.g. 404
+        for a deleted post) return the body as-is, like `requests` did before.
+
+        With a cache, fresh pages are served from disk and stale ones are
+        revalidated with If-None-Match / If-Modified-Since.
+        """
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached and self.cache.is_fresh(cached):
+            self.stats["cache_hits"] += 1
+            return cached.text
+
+        limit, bucket = self._host_state(url)
+        last_error = None
+
+        headers = self._headers()
+        if cached:
+            headers.update(self.cache.conditional_headers(cached))
+
+        for attempt in range(self.max_retries + 1):
+            await bucket.acquire()
+            retry_after = None
+            try:
+                async with limit:
+                    self.stats["requests"] += 1
+                    async with self.session.get(url, headers=headers) as response:
+                        if response.status == 304 and cached:
+                            self.stats["not_modified"] += 1
+                            self.cache.mark_revalidated(url)
+                            return cached.text
+
+                        if response.status not in RETRY_STATUSES:
+                            body = await response.read()
+                            self.stats["bytes"] += len(body)
+                            text = body.decode(response.get_encoding() or "utf-8", errors="replace")
+
+                            # only keep real pages; error pages would poison the cache
+                            if self.cache is not None and response.status == 200:
+                                self.cache.put(
+                                    url,
+                                    text,
+                                    etag=response.headers.get("ETag"),
+                                    last_modified=response.headers.get("Last-Modified"),
+                                )
+                            return text
+
+                        retry_after = response.headers.get("Retry-After")
+                        last_error = f"HTTP {response.status}"
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                last_error = f"{type(e).__name__}: {e}"
+
+            if attempt < self.max_retries:
+                self.stats["retries"] += 1
+                await asyncio.sleep(self._backoff(attempt, retry_after))
+
+        self.stats["failures"] += 1
+        raise FetchError(f"{url} failed after {self.max_retries + 1} attempts ({last_error})")
+
+
+async def scrape_listings_async(
+    urls: Iterable[str],
+    parse: Callable[[str, str], Dict],
+    concurrency: int = 64,
+    show_progress: bool = True,
+    **fetcher_kwargs,
+) -> List[Dict]:
+    """
+    Fetches every URL with a fixed pool of worker tasks and turns each page into
+    a record with `parse(url, text)`. URLs that still fail after retries are
+    reported at the end instead of aborting the whole run.
+    """
+    urls = list(urls)
+    records: List[Dict] = []
+    failures: List[str] = []
+    url_iter = iter(urls)
+    progress = tqdm(total=len(urls), desc="Processing", disable=not show_progress)
+
+    async with AsyncFetcher(**fetcher_kwargs) as fetcher:
+
+        async def worker():
+            for url in url_iter:
+                try:
+                    text = await fetcher.fetch(url)
+                    records.append(parse(url, text))
+                except FetchError as e:
+                    failures.append(str(e))
+                progress.update(1)
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        stats = fetcher.stats
+
+    progress.close()
+
+    print(
+        f"Fetched {len(records)} pages "
+        f"({stats['requests']} requests, {stats['cache_hits']} cache hits, "
+        f"{stats['not_modified']} not modified, {stats['retries']} retries, {len(failures)} failed)"
+    )
+    for message in failures[:10]:
+        print(f"  FAILED: {message}")
+
+    return records
+
+
+def scrape_listings(urls: Iterable[str], parse: Callable[[str, str], Dict], **kwargs) -> List[Dict]:
+    """Synchronous wrapper around `scrape_listings_async`."""
+    return asyncio.run(scrape_listings_async(urls, parse, **kwargs))
@@ -0,0 +1,32 @@
+"""
+Micro-benchmark for the detail-page extractor against the saved HTML fixtures.
+Runs on a single core, so the result is pages/sec per core.
+
+    python bench_extract.py          # 5,000 pages
+    python bench_extract.py 20000
+"""
+import sys
+import time
+
+from extract import extract_listing
+from stub_server import load_fixtures
+
+
+def bench(n: int = 5000):
+    pages = [page.decode("utf-8") for page in load_fixtures()]
+
+    # warm up so the first-call overhead isn't measured
+    for page in pages:
+        extract_listing(page)
+
+    start_time = time.perf_counter()
+    for i in range(n):
+        extract_listing(pages[i % len(pages)])
+    elapsed = time.perf_counter() - start_time
+
+    avg_kb = sum(len(page) for page in pages) / len(pages) / 1024
+    print(f"Extracted {n} pages ({avg_kb:.1f} KB avg) in {elapsed:.2f}s: {n / elapsed:,.0f} pages/sec per core")
+
+
+if __name__ == "__main__":
+    bench(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,161 @@
+"""
+Adaptive price-bucket planning and parallel bucket harvesting.
+
+Craigslist truncates a search after RESULT_CAP results, so a fixed $200 grid loses
+listings in dense price ranges and wastes a page load on every sparse one. Here:
+
+- the plan comes from the previous run's per-bucket counts when available:
+  adjacent sparse buckets are merged and dense ones are split up front;
+- any bucket that still hits the cap during the run is split in half and both
+  halves are queued;
+- the last bucket is open-ended, so nothing above the top price is skipped;
+- buckets are harvested concurrently, one harvester (HTTP session, and Chrome
+  only if needed) per worker thread.
+"""
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+
+class PriceRange(NamedTuple):
+    low: int
+    high: Optional[int]  # None means no upper bound
+
+    def label(self) -> str:
+        return f"${self.low}-{self.high}" if self.high is not None else f"${self.low}+"
+
+    def width(self) -> Optional[int]:
+        return None if self.high is None else self.high - self.low
+
+
+def default_plan(start: int, stop: int, width: int) -> List[PriceRange]:
+    """Fixed-width buckets from start to stop, plus an open-ended bucket above stop."""
+    plan = [PriceRange(low, min(low + width, stop)) for low in range(start, stop, width)]
+    plan.append(PriceRange(stop, None))
+    return plan
+
+
+def split_range(price_range: PriceRange) -> List[PriceRange]:
+    if price_range.high is None:
+        # open-ended: peel off [low, 2*low) and keep the rest open
+        mid = max(price_range.low * 2, price_range.low + 1)
+        return [PriceRange(price_range.low, mid), PriceRange(mid, None)]
+
+    mid = (price_range.low + price_range.high) // 2
+    return [PriceRange(price_range.low, mid), PriceRange(mid, price_range.high)]
+
+
+def plan_from_counts(counts: List[Tuple[int, Optional[int], int]], cap: int, min_width: int) -> List[PriceRange]:
+    """
+    Builds a plan from the previous run's (low, high, count) rows: adjacent
+    buckets are merged while their combined count stays under half the cap,
+    and buckets at or over the cap are split ahead of time.
+    """
+    target = cap // 2
+    plan: List[PriceRange] = []
+    merged_count = 0
+
+    for low, high, count in sorted(counts, key=lambda row: row[0]):
+        price_range = PriceRange(int(low), None if pd.isna(high) else int(high))
+
+        if plan and plan[-1].high == price_range.low and merged_count + count <= target \
+                and price_range.high is not None:
+            plan[-1] = PriceRange(plan[-1].low, price_range.high)
+            merged_count += count
+            continue
+
+        # split dense buckets assuming prices are spread evenly inside them
+        pieces = [price_range]
+        estimated = count
+        while estimated >= cap and all((p.width() or min_width * 2) >= min_width * 2 for p in pieces):
+            pieces = [half for p in pieces for half in split_range(p)]
+            estimated /= 2
+
+        plan.extend(pieces)
+        merged_count = estimated
+
+    return plan
+
+
+def load_plan(counts_path: str, start: int, stop: int, width: int, cap: int, min_width: int) -> List[PriceRange]:
+    if os.path.exists(counts_path):
+        counts = pd.read_csv(counts_path)
+        print(f"Planning buckets from {len(counts)} previous bucket counts in {counts_path}")
+        return plan_from_counts(list(counts.itertuples(index=False, name=None)), cap, min_width)
+    return default_plan(start, stop, width)
+
+
+def save_counts(counts_path: str, counts: List[Tuple[PriceRange, int]]):
+    rows = [{"low": r.low, "high": r.high, "count": count} for r, count in sorted(counts)]
+    pd.DataFrame(rows, columns=["low", "high", "count"]).to_csv(counts_path, index=False)
+
+
+def harvest_adaptive(
+    plan: List[PriceRange],
+    make_harvester: Callable[[], object],
+    workers: int = 4,
+    cap: int = 3000,
+    min_width: int = 25,
+) -> Tuple[Dict[str, Dict], List[Tuple[PriceRange, int]]]:
+    """
+    Harvests every bucket in the plan with `workers` threads. Each thread lazily
+    builds its own harvester with make_harvester(); harvesters need
+    harvest(min_price, max_price) and close().
+
+    Returns (listings by pid, [(range, count)] for the buckets that weren't split).
+    """
+    local = threading.local()
+    harvesters = []
+    harvesters_lock = threading.Lock()
+
+    def harvest(price_range: PriceRange) -> Dict[str, Dict]:
+        if not hasattr(local, "harvester"):
+            local.harvester = make_harvester()
+            with harvesters_lock:
+                harvesters.append(local.harvester)
+        return local.harvester.harvest(price_range.low, price_range.high)
+
+    all_listings_by_pid: Dict[str, Dict] = {}
+    leaf_counts: List[Tuple[PriceRange, int]] = []
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            pending = {executor.submit(harvest, r): r for r in plan}
+
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    price_range = pending.pop(future)
+                    bucket_listings = future.result()
+
+                    new_from_bucket = 0
+                    for pid, listing in bucket_listings.items():
+                        if pid not in all_listings_by_pid:
+                            all_listings_by_pid[pid] = listing
+                            new_from_bucket += 1
+
+                    can_split = price_range.high is None or price_range.width() >= min_width * 2
+                    if len(bucket_listings) >= cap and can_split:
+                        # truncated: harvest both halves to recover the cut-off listings
+                        halves = split_range(price_range)
+                        print(f"=== Bucket {price_range.label()} hit the {cap} result cap; "
+                              f"splitting into {', '.join(h.label() for h in halves)} ===")
+                        for half in halves:
+                            pending[executor.submit(harvest, half)] = half
+                    else:
+                        leaf_counts.append((price_range, len(bucket_listings)))
+
+                    print(
+                        f"=== Bucket summary {price_range.label()}: "
+                        f"{len(bucket_listings)} unique in bucket, "
+                        f"{new_from_bucket} new globally, "
+                        f"{len(all_listings_by_pid)} total unique so far ==="
+                    )
+    finally:
+        for harvester in harvesters:
+            harvester.close()
+
+    return all_listings_by_pid, leaf_counts
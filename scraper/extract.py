@@ -0,0 +1,118 @@
+"""
+Single-pass extractor for Craigslist listing detail pages.
+
+Each page is parsed once. One precompiled XPath collects the address, the map
+element and every attribute span in document order, and the attributes are
+classified in a single loop (beds, baths, sqft, laundry, parking, housing type).
+"""
+import re
+from typing import Dict, Optional
+
+from lxml import etree, html
+
+# everything we need besides the description, in one document-order query
+DETAILS_XPATH = etree.XPath(
+    "//h2[@class='street-address']"
+    " | //div[@id='map']"
+    " | //*[contains(concat(' ', normalize-space(@class), ' '), ' attr ')]"
+)
+DESCRIPTION_XPATH = etree.XPath("//section[contains(@id,'postingbody')]//text()")
+
+# "1BR / 1Ba", "2BR / 1.5Ba", "10BR / 3Ba", "0BR / shared Ba"
+BEDS_RE = re.compile(r"(\d+(?:\.\d+)?)\s*BR", re.IGNORECASE)
+BATHS_RE = re.compile(r"(\d+(?:\.\d+)?)\s*Ba\b")
+SQFT_RE = re.compile(r"(\d[\d,]*)\s*ft2", re.IGNORECASE)
+ZIP_RE = re.compile(r"\b(\d{5})\s*$")
+
+LAUNDRY_RE = re.compile(r"laundry|w/d", re.IGNORECASE)
+PARKING_RE = re.compile(r"parking|garage|carport", re.IGNORECASE)
+HOUSING_TYPES = {
+    "apartment", "condo", "cottage/cabin", "duplex", "flat", "house",
+    "in-law", "loft", "townhouse", "manufactured", "assisted living", "land",
+}
+
+
+def _number(text: str) -> Optional[float]:
+    try:
+        return float(text.replace(",", ""))
+    except ValueError:
+        return None
+
+
+def _attr_text(el) -> str:
+    # newer layout: <div class="attr"><span class="labl">laundry:</span><span class="valu">w/d in unit</span></div>
+    valu = [child for child in el if child.get("class") == "valu"]
+    text = valu[0].text_content() if valu else el.text_content()
+    return " ".join(text.split())
+
+
+def extract_details(tree) -> Dict:
+    """
+    Pulls every detail field out of a parsed page.
+    Fields that aren't on the page are None.
+    """
+    details = {
+        "beds": None,
+        "baths": None,
+        "sqft": None,
+        "laundry": None,
+        "parking": None,
+        "housing_type": None,
+        "latitude": None,
+        "longitude": None,
+        "zip_code": None,
+    }
+
+    for el in DETAILS_XPATH(tree):
+        if el.tag == "h2":
+            # the zip code is the last token of the street address
+            match = ZIP_RE.search(el.text_content().strip())
+            if match:
+                details["zip_code"] = match.group(1)
+            continue
+
+        if el.tag == "div" and el.get("id") == "map":
+            details["latitude"] = _number(el.get("data-latitude") or "")
+            details["longitude"] = _number(el.get("data-longitude") or "")
+            continue
+
+        text = _attr_text(el)
+        if not text:
+            continue
+
+        if "important" in el.get("class", ""):
+            # <sup>2</sup> in "650ft<sup>2</sup>" comes through as "650ft2"
+            beds = BEDS_RE.search(text)
+            baths = BATHS_RE.search(text)
+            sqft = SQFT_RE.search(text)
+            if beds and details["beds"] is None:
+                details["beds"] = _number(beds.group(1))
+            if baths and details["baths"] is None:
+                details["baths"] = _number(baths.group(1))
+            if sqft and details["sqft"] is None:
+                details["sqft"] = _number(sqft.group(1))
+            continue
+
+        lowered = text.lower()
+        if details["laundry"] is None and LAUNDRY_RE.search(lowered):
+            details["laundry"] = lowered
+        elif details["parking"] is None and PARKING_RE.search(lowered):
+            details["parking"] = lowered
+        elif details["housing_type"] is None and lowered in HOUSING_TYPES:
+            details["housing_type"] = lowered
+
+    return details
+
+
+def extract_description(tree) -> str:
+    p_text = DESCRIPTION_XPATH(tree)
+    clean_text = [t.strip() for t in p_text if t.strip()]
+    return "\n".join(clean_text)
+
+
+def extract_listing(text: str) -> Dict:
+    """Parses a page once and returns the details plus the description."""
+    tree = html.fromstring(text)
+    details = extract_details(tree)
+    details["description"] = extract_description(tree)
+    return details
@@ -0,0 +1,156 @@
+"""
+Plain-HTTP harvester for Craigslist search results.
+
+The search page is served with a static, no-JavaScript result list
+(`li.cl-static-search-result`) plus a JSON-LD block (`#ld_searchpage_results`)
+describing the same results in the same order. Between the two we get the
+pid/url/price/beds/hood fields that `scrape_bucket` collects through Selenium,
+from one HTTP request per page and without a browser.
+"""
+import json
+import random
+import re
+import time
+from typing import Dict, List, Optional
+
+import requests
+from lxml import etree, html
+
+RESULTS_XPATH = etree.XPath("//li[contains(@class, 'cl-static-search-result')]")
+LD_JSON_XPATH = etree.XPath("//script[@id='ld_searchpage_results']/text()")
+
+PID_RE = re.compile(r"/(\d+)\.html")
+SQFT_RE = re.compile(r"(\d[\d,]*)\s*ft2", re.IGNORECASE)
+BEDS_RE = re.compile(r"(\d+)\s*br", re.IGNORECASE)
+
+USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+    "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36",
+    "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36"
+]
+
+
+class HarvestError(Exception):
+    """The search page couldn't be read over HTTP; callers fall back to Selenium."""
+
+
+def _first_text(el, xpath: str) -> Optional[str]:
+    found = el.xpath(xpath)
+    if not found:
+        return None
+    text = found[0].text_content().strip()
+    return text or None
+
+
+def _ld_items(tree) -> List[Dict]:
+    scripts = LD_JSON_XPATH(tree)
+    if not scripts:
+        return []
+    try:
+        data = json.loads(scripts[0])
+    except ValueError:
+        return []
+    return [entry.get("item", {}) for entry in data.get("itemListElement", [])]
+
+
+def parse_search_page(text: str) -> List[Dict]:
+    """Returns the listings on one search page, in page order."""
+    tree = html.fromstring(text)
+    results = RESULTS_XPATH(tree)
+    ld_items = _ld_items(tree)
+
+    listings = []
+    for i, el in enumerate(results):
+        anchors = el.xpath(".//a[@href]")
+        if not anchors:
+            continue
+        url = anchors[0].get("href")
+
+        match = PID_RE.search(url)
+        if not match:
+            continue
+        pid = match.group(1)
+
+        price = _first_text(el, ".//div[@class='price']")
+        price = int(price.replace("$", "").replace(",", "")) if price else None
+
+        hood = _first_text(el, ".//div[@class='location']")
+
+        # the JSON-LD list is in the same order as the static results
+        item = ld_items[i] if i < len(ld_items) else {}
+        beds = item.get("numberOfBedrooms")
+        beds = int(beds) if beds is not None else None
+
+        # some result layouts also carry a "1br - 650ft2" housing line
+        sqft = None
+        housing = _first_text(el, ".//div[@class='housing']")
+        if housing:
+            sqft_match = SQFT_RE.search(housing)
+            if sqft_match:
+                sqft = int(sqft_match.group(1).replace(",", ""))
+            if beds is None:
+                beds_match = BEDS_RE.search(housing)
+                if beds_match:
+                    beds = int(beds_match.group(1))
+
+        listings.append({
+            "pid": pid,
+            "url": url,
+            "price": price,
+            "beds": beds,
+            "sqft": sqft,
+            "hood": hood,
+        })
+
+    return listings
+
+
+def harvest_bucket(
+    session: requests.Session,
+    base_url: str,
+    min_price: int,
+    max_price: Optional[int],
+    page_size: int = 120,
+    max_pages: int = 30,
+    timeout: float = 15.0,
+) -> Dict[str, Dict]:
+    """
+    Harvests one price bucket over plain HTTP. Pages through the results with the
+    `s` offset until a page adds no new pids. Returns a dict: pid -> listing_info.
+    Raises HarvestError when the page can't be fetched or has an unexpected layout.
+    """
+    params = {"min_price": min_price}
+    if max_price is not None:
+        params["max_price"] = max_price
+
+    listings_by_pid: Dict[str, Dict] = {}
+    for page in range(max_pages):
+        if page:
+            params["s"] = page * page_size
+
+        headers = {"User-Agent": random.choice(USER_AGENTS)}
+        try:
+            response = session.get(base_url, params=params, headers=headers, timeout=timeout)
+            response.raise_for_status()
+        except requests.RequestException as e:
+            raise HarvestError(f"search page request failed: {e}")
+
+        page_listings = parse_search_page(response.text)
+        if page == 0 and not page_listings and "cl-static-search-result" not in response.text:
+            # nothing parsed and no static list at all: the layout changed
+            if "no results" not in response.text.lower():
+                raise HarvestError("no static result list on the search page")
+
+        new_pids = 0
+        for listing in page_listings:
+            if listing["pid"] not in listings_by_pid:
+                listings_by_pid[listing["pid"]] = listing
+                new_pids += 1
+
+        if new_pids == 0 or len(page_listings) < page_size:
+            break
+
+        # small pause between result pages of the same bucket
+        time.sleep(random.uniform(0.2, 0.5))
+
+    return listings_by_pid
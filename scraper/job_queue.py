@@ -0,0 +1,233 @@
+"""
+Durable work queue for the detail scraper.
+
+Every URL is a row in an SQLite `jobs` table (url / status / attempts / last_error).
+Workers claim pending URLs in small batches and parsed records are flushed to a
+`results` table in batches, so an interrupted run resumes exactly where it stopped
+and memory use doesn't grow with the number of queued URLs.
+"""
+import asyncio
+import json
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+from tqdm import tqdm
+
+from async_fetch import AsyncFetcher
+from pipeline import run_pipeline
+
+PENDING = "pending"
+IN_PROGRESS = "in_progress"
+DONE = "done"
+FAILED = "failed"
+
+
+class JobQueue:
+
+    def __init__(self, db_path: str = "scrape_jobs.db", max_attempts: int = 3):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                url TEXT PRIMARY KEY,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                last_error TEXT,
+                updated_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status);
+
+            CREATE TABLE IF NOT EXISTS results (
+                url TEXT PRIMARY KEY,
+                record TEXT NOT NULL
+            );
+        """)
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def enqueue(self, urls: Iterable[str]) -> int:
+        """Adds URLs that aren't queued yet. Returns how many were new."""
+        before = self.conn.total_changes
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO jobs (url, updated_at) VALUES (?, ?)",
+            ((url, time.time()) for url in urls),
+        )
+        self.conn.commit()
+        return self.conn.total_changes - before
+
+    def recover(self) -> int:
+        """Puts jobs claimed by a crashed run back into the pending state."""
+        count = self.conn.execute(
+            "UPDATE jobs SET status = ? WHERE status = ?", (PENDING, IN_PROGRESS)
+        ).rowcount
+        self.conn.commit()
+        return count
+
+    def claim(self, n: int) -> List[str]:
+        rows = self.conn.execute(
+            "SELECT url FROM jobs WHERE status = ? AND attempts < ? LIMIT ?",
+            (PENDING, self.max_attempts, n),
+        ).fetchall()
+        urls = [url for (url,) in rows]
+
+        self.conn.executemany(
+            "UPDATE jobs SET status = ?, updated_at = ? WHERE url = ?",
+            [(IN_PROGRESS, time.time(), url) for url in urls],
+        )
+        self.conn.commit()
+        return urls
+
+    def complete(self, records: List[Dict]):
+        """Stores a batch of parsed records and marks their jobs done, in one transaction."""
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO results (url, record) VALUES (?, ?)",
+                [(record["url"], json.dumps(record)) for record in records],
+            )
+            self.conn.executemany(
+                "UPDATE jobs SET status = ?, attempts = attempts + 1, last_error = NULL, updated_at = ? WHERE url = ?",
+                [(DONE, now, record["url"]) for record in records],
+            )
+
+    def fail(self, errors: List[tuple]):
+        """
+        Records failed (url, error) pairs. Jobs go back to pending until they
+        run out of attempts, then stay failed.
+        """
+        now = time.time()
+        with self.conn:
+            self.conn.executemany("""
+                UPDATE jobs
+                SET attempts = attempts + 1,
+                    status = CASE WHEN attempts + 1 >= ? THEN ? ELSE ? END,
+                    last_error = ?,
+                    updated_at = ?
+                WHERE url = ?
+            """, [(self.max_attempts, FAILED, PENDING, error, now, url) for url, error in errors])
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self.conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall())
+
+    def remaining(self) -> int:
+        return self.conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE status = ? AND attempts < ?", (PENDING, self.max_attempts)
+        ).fetchone()[0]
+
+    def iter_results(self, chunk_size: int = 5000) -> Iterator[pd.DataFrame]:
+        """Yields stored records as DataFrames of at most chunk_size rows."""
+        cursor = self.conn.execute("SELECT record FROM results ORDER BY rowid")
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield pd.DataFrame([json.loads(record) for (record,) in rows])
+
+    def export_merged(self, listings: pd.DataFrame, out_path: str, chunk_size: int = 5000) -> int:
+        """
+        Left-joins the stored detail records onto the search listings and writes
+        the result chunk by chunk. Returns the number of rows written.
+        """
+        written = 0
+        columns = None
+        for details_df in self.iter_results(chunk_size):
+            merged = listings.merge(details_df, on="url", how="inner")
+            if columns is None:
+                columns = list(merged.columns)
+            merged = merged.reindex(columns=columns)
+            merged.to_csv(out_path, mode="w" if written == 0 else "a", header=written == 0, index=False)
+            written += len(merged)
+
+        # listings without a scraped detail page keep empty detail columns
+        done_urls = {url for (url,) in self.conn.execute("SELECT url FROM results")}
+        missing = listings[~listings["url"].isin(done_urls)]
+        if len(missing):
+            if columns is not None:
+                missing = missing.reindex(columns=columns)
+            missing.to_csv(out_path, mode="w" if written == 0 else "a", header=written == 0, index=False)
+            written += len(missing)
+
+        return written
+
+
+async def run_queue_async(
+    queue: JobQueue,
+    parse: Callable[[str, str], Dict],
+    concurrency: int = 64,
+    parse_workers: Optional[int] = None,
+    claim_size: int = 200,
+    flush_every: int = 500,
+    show_progress: bool = True,
+    **fetcher_kwargs,
+) -> Dict[str, int]:
+    """
+    Drains the queue through the two-stage fetch/parse pipeline: URLs are
+    claimed in batches, and results are flushed every `flush_every` records.
+    Returns the final status counts.
+    """
+    recovered = queue.recover()
+    if recovered:
+        print(f"Recovered {recovered} jobs from an interrupted run.")
+
+    progress = tqdm(total=queue.remaining(), desc="Processing", disable=not show_progress)
+    done_buffer: List[Dict] = []
+    error_buffer: List[tuple] = []
+
+    def flush():
+        if done_buffer:
+            queue.complete(done_buffer)
+            done_buffer.clear()
+        if error_buffer:
+            queue.fail(error_buffer)
+            error_buffer.clear()
+
+    def on_records(records: List[Dict]):
+        done_buffer.extend(records)
+        if len(done_buffer) >= flush_every:
+            flush()
+
+    def on_errors(errors: List[tuple]):
+        error_buffer.extend(errors)
+        if len(error_buffer) >= flush_every:
+            flush()
+
+    async with AsyncFetcher(**fetcher_kwargs) as fetcher:
+        try:
+            await run_pipeline(
+                lambda: queue.claim(claim_size),
+                parse,
+                fetcher,
+                on_records,
+                on_errors,
+                fetch_concurrency=concurrency,
+                parse_workers=parse_workers,
+                progress=progress,
+            )
+        finally:
+            # keep whatever finished, even when interrupted
+            flush()
+            progress.close()
+
+    counts = queue.counts()
+    print(f"Queue status: {counts}")
+    return counts
+
+
+def run_queue(queue: JobQueue, parse: Callable[[str, str], Dict], **kwargs) -> Dict[str, int]:
+    """Synchronous wrapper around `run_queue_async`."""
+    return asyncio.run(run_queue_async(queue, parse, **kwargs))
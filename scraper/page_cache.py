@@ -0,0 +1,207 @@
+"""
+Persistent on-disk cache of listing pages.
+
+Pages are indexed by URL in a small SQLite database and stored by content hash
+as gzip-compressed blobs, so identical pages are kept once. The cache is bounded
+by total compressed size and evicts the least recently used URLs first. ETag /
+Last-Modified validators are kept for conditional revalidation.
+
+Layout:
+    page_cache/index.db
+    page_cache/blobs/ab/ab12...ef.html.gz
+"""
+import gzip
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Dict, Iterator, NamedTuple, Optional
+
+
+class CachedPage(NamedTuple):
+    url: str
+    text: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    fetched_at: float
+
+
+class PageCache:
+
+    def __init__(self, cache_dir: str = "page_cache", max_bytes: int = 2 * 1024 ** 3, max_age: float = 24 * 3600):
+        """
+        max_bytes: bound on the total size of compressed blobs
+        max_age:   seconds a page is served without revalidating it
+        """
+        self.cache_dir = cache_dir
+        self.blob_dir = os.path.join(cache_dir, "blobs")
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        os.makedirs(self.blob_dir, exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(cache_dir, "index.db"))
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL,
+                last_access REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_pages_last_access ON pages(last_access);
+            CREATE INDEX IF NOT EXISTS idx_pages_content_hash ON pages(content_hash);
+
+            CREATE TABLE IF NOT EXISTS blobs (
+                content_hash TEXT PRIMARY KEY,
+                size INTEGER
+            );
+        """)
+        self.conn.commit()
+
+        self.total_bytes = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _blob_path(self, content_hash: str) -> str:
+        return os.path.join(self.blob_dir, content_hash[:2], f"{content_hash}.html.gz")
+
+    def _read_blob(self, content_hash: str) -> str:
+        with gzip.open(self._blob_path(content_hash), "rb") as f:
+            return f.read().decode("utf-8")
+
+    def get(self, url: str) -> Optional[CachedPage]:
+        """Returns the cached page for a URL (and marks it recently used), or None."""
+        row = self.conn.execute(
+            "SELECT content_hash, etag, last_modified, fetched_at FROM pages WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        content_hash, etag, last_modified, fetched_at = row
+        try:
+            text = self._read_blob(content_hash)
+        except FileNotFoundError:
+            # blob removed behind our back, treat as a miss
+            self.conn.execute("DELETE FROM pages WHERE url = ?", (url,))
+            return None
+
+        self.conn.execute("UPDATE pages SET last_access = ? WHERE url = ?", (time.time(), url))
+        return CachedPage(url, text, etag, last_modified, fetched_at)
+
+    def is_fresh(self, page: CachedPage) -> bool:
+        return time.time() - page.fetched_at < self.max_age
+
+    def conditional_headers(self, page: CachedPage) -> Dict[str, str]:
+        """Validators to send so the server can answer 304 Not Modified."""
+        headers = {}
+        if page.etag:
+            headers["If-None-Match"] = page.etag
+        if page.last_modified:
+            headers["If-Modified-Since"] = page.last_modified
+        return headers
+
+    def mark_revalidated(self, url: str):
+        """Server answered 304: the stored copy is current again."""
+        now = time.time()
+        self.conn.execute("UPDATE pages SET fetched_at = ?, last_access = ? WHERE url = ?", (now, now, url))
+        self.conn.commit()
+
+    def put(self, url: str, text: str, etag: Optional[str] = None, last_modified: Optional[str] = None):
+        data = text.encode("utf-8")
+        content_hash = hashlib.sha256(data).hexdigest()
+        path = self._blob_path(content_hash)
+
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # write then rename so a crash never leaves a truncated blob behind
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(gzip.compress(data, compresslevel=6))
+            os.replace(tmp_path, path)
+
+        size = os.path.getsize(path)
+        inserted = self.conn.execute(
+            "INSERT OR IGNORE INTO blobs (content_hash, size) VALUES (?, ?)", (content_hash, size)
+        ).rowcount
+        if inserted:
+            self.total_bytes += size
+
+        old = self.conn.execute("SELECT content_hash FROM pages WHERE url = ?", (url,)).fetchone()
+
+        now = time.time()
+        self.conn.execute("""
+            INSERT INTO pages (url, content_hash, etag, last_modified, fetched_at, last_access)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                content_hash = excluded.content_hash,
+                etag = excluded.etag,
+                last_modified = excluded.last_modified,
+                fetched_at = excluded.fetched_at,
+                last_access = excluded.last_access
+        """, (url, content_hash, etag, last_modified, now, now))
+
+        # page changed: drop the previous version if nothing else points at it
+        if old and old[0] != content_hash:
+            self._drop_unreferenced([old[0]])
+
+        self.conn.commit()
+
+        if self.total_bytes > self.max_bytes:
+            self.evict()
+
+    def _drop_unreferenced(self, hashes):
+        for content_hash in hashes:
+            still_used = self.conn.execute(
+                "SELECT 1 FROM pages WHERE content_hash = ? LIMIT 1", (content_hash,)
+            ).fetchone()
+            if still_used:
+                continue
+
+            row = self.conn.execute("SELECT size FROM blobs WHERE content_hash = ?", (content_hash,)).fetchone()
+            self.conn.execute("DELETE FROM blobs WHERE content_hash = ?", (content_hash,))
+            if row:
+                self.total_bytes -= row[0]
+            try:
+                os.remove(self._blob_path(content_hash))
+            except FileNotFoundError:
+                pass
+
+    def evict(self, target_fraction: float = 0.9):
+        """
+        Drops least recently used URLs until the cache is below
+        target_fraction * max_bytes, so eviction doesn't run on every put.
+        """
+        target = self.max_bytes * target_fraction
+        evicted = 0
+
+        while self.total_bytes > target:
+            rows = self.conn.execute(
+                "SELECT url, content_hash FROM pages ORDER BY last_access LIMIT 500"
+            ).fetchall()
+            if not rows:
+                break
+
+            self.conn.executemany("DELETE FROM pages WHERE url = ?", [(url,) for url, _ in rows])
+            self._drop_unreferenced({content_hash for _, content_hash in rows})
+            evicted += len(rows)
+
+        self.conn.commit()
+        return evicted
+
+    def urls(self) -> Iterator[str]:
+        for (url,) in self.conn.execute("SELECT url FROM pages ORDER BY url").fetchall():
+            yield url
+
+    def __len__(self):
+        return self.conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
@@ -0,0 +1,177 @@
+"""
+Two-stage scrape pipeline: network I/O and HTML parsing run in separate stages.
+
+    claim urls -> [fetch workers, asyncio] -> page queue -> [parse pool, processes] -> sink
+
+Fetch workers only download page text. A dispatcher batches pages from a bounded
+queue into a ProcessPoolExecutor, so lxml parsing scales across cores instead of
+competing with the event loop for the GIL. When parsing falls behind, the page
+queue fills up and fetch workers block on it (back-pressure), which keeps memory
+bounded no matter how many URLs are queued.
+"""
+import asyncio
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from async_fetch import AsyncFetcher, FetchError
+
+
+class StageCounter:
+    """Throughput counter for one pipeline stage."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.errors = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+
+    def add(self, items: int = 1, nbytes: int = 0):
+        self.items += items
+        self.bytes += nbytes
+
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.started
+        return self.items / elapsed if elapsed > 0 else 0.0
+
+    def summary(self) -> str:
+        text = f"{self.name}: {self.items} items, {self.errors} errors, {self.rate():.1f} items/sec"
+        if self.bytes:
+            text += f", {self.bytes / 1024 ** 2:.1f} MB"
+        return text
+
+
+def parse_batch(parse: Callable[[str, str], Dict], pages: List[Tuple[str, str]]):
+    """
+    Runs in a worker process. Returns (records, errors) so one bad page
+    doesn't lose the rest of the batch.
+    """
+    records, errors = [], []
+    for url, text in pages:
+        try:
+            records.append(parse(url, text))
+        except Exception as e:
+            errors.append((url, f"{type(e).__name__}: {e}"))
+    return records, errors
+
+
+async def run_pipeline(
+    next_urls: Callable[[], List[str]],
+    parse: Callable[[str, str], Dict],
+    fetcher: AsyncFetcher,
+    on_records: Callable[[List[Dict]], None],
+    on_errors: Callable[[List[tuple]], None],
+    fetch_concurrency: int = 64,
+    parse_workers: Optional[int] = None,
+    batch_size: int = 32,
+    max_pending_pages: int = 512,
+    progress=None,
+) -> Dict[str, StageCounter]:
+    """
+    next_urls:  returns the next batch of URLs to scrape, or [] when done
+    parse:      picklable top-level function (url, text) -> record
+    on_records / on_errors: sinks called on the event loop with each parsed batch
+    """
+    parse_workers = parse_workers or os.cpu_count() or 1
+    url_queue: asyncio.Queue = asyncio.Queue(maxsize=fetch_concurrency * 2)
+    page_queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending_pages)
+    counters = {"fetch": StageCounter("fetch"), "parse": StageCounter("parse")}
+
+    def report(n: int):
+        if progress is not None:
+            progress.update(n)
+
+    async def feeder():
+        while True:
+            urls = next_urls()
+            if not urls:
+                break
+            for url in urls:
+                await url_queue.put(url)
+        for _ in range(fetch_concurrency):
+            await url_queue.put(None)
+
+    async def fetch_worker():
+        while True:
+            url = await url_queue.get()
+            if url is None:
+                break
+            try:
+                text = await fetcher.fetch(url)
+            except FetchError as e:
+                counters["fetch"].errors += 1
+                on_errors([(url, str(e))])
+                report(1)
+                continue
+
+            counters["fetch"].add(1, len(text))
+            # blocks when the parse stage is behind
+            await page_queue.put((url, text))
+
+    async def parse_dispatcher(pool: ProcessPoolExecutor):
+        loop = asyncio.get_running_loop()
+        # at most two batches queued per parse worker
+        in_flight = asyncio.Semaphore(parse_workers * 2)
+        tasks = set()
+
+        async def run_batch(batch):
+            try:
+                records, errors = await loop.run_in_executor(pool, parse_batch, parse, batch)
+                if records:
+                    on_records(records)
+            except Exception as e:
+                # a broken pool or a failing sink: the whole batch is reported as failed
+                counters["parse"].errors += len(batch)
+                on_errors([(url, f"{type(e).__name__}: {e}") for url, _ in batch])
+            else:
+                counters["parse"].add(len(records))
+                counters["parse"].errors += len(errors)
+                if errors:
+                    on_errors(errors)
+            finally:
+                in_flight.release()
+            report(len(batch))
+
+        def finished(task):
+            # failed tasks stay in the set, so the final gather raises their exception
+            if task.cancelled() or task.exception() is None:
+                tasks.discard(task)
+
+        async def submit(batch):
+            await in_flight.acquire()
+            task = asyncio.create_task(run_batch(batch))
+            tasks.add(task)
+            task.add_done_callback(finished)
+
+        batch = []
+        while True:
+            item = await page_queue.get()
+            if item is None:
+                break
+            batch.append(item)
+
+            # send full batches, or whatever is there when fetching is the bottleneck
+            if len(batch) >= batch_size or page_queue.empty():
+                await submit(batch)
+                batch = []
+
+        if batch:
+            await submit(batch)
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    with ProcessPoolExecutor(max_workers=parse_workers) as pool:
+        dispatcher = asyncio.create_task(parse_dispatcher(pool))
+        try:
+            await asyncio.gather(feeder(), *(fetch_worker() for _ in range(fetch_concurrency)))
+            await page_queue.put(None)
+            await dispatcher
+        finally:
+            dispatcher.cancel()
+
+    for counter in counters.values():
+        print(f"  {counter.summary()}")
+
+    return counters
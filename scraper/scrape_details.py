@@ -1,105 +1,100 @@
 import pandas as pd
 import time
-import random
-from concurrent.futures import ThreadPoolExecutor, as_completed
-import requests
-from bs4 import BeautifulSoup
-from lxml import html
-import os
-from tqdm import tqdm
 
 from typing import List, Dict, Optional
 
+from extract import extract_listing
+from job_queue import JobQueue, run_queue
+from page_cache import PageCache
+
 USER_AGENTS = [
     "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
     "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36",
     "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36"
 ]
 
+# fetch engine settings (per host, craigslist is a single host)
+PER_HOST_CONCURRENCY = 16
+REQUESTS_PER_SECOND = 20.0
+REQUEST_TIMEOUT = 15.0
+MAX_RETRIES = 4
 
-def get_description(tree) -> str:
-    p_text = tree.xpath("//section[contains(@id,'postingbody')]//text()")
-    clean_text = [t.strip() for t in p_text if t.strip()]
-    description = "\n".join(clean_text)
-
-    return description
-
-
-def get_zip_code(tree) -> str:
-    p_text = tree.xpath("//h2[@class='street-address']")
-    if not p_text: return None
-
-    clean_text = p_text[0].text_content().strip().split(" ")
-
-    if not clean_text: return None
-
-    zip_code = clean_text[-1]
-
-    return zip_code
+# parse stage runs in a process pool (None = one worker per core)
+PARSE_WORKERS = None
 
+# on-disk page cache: pages younger than CACHE_MAX_AGE are not re-requested,
+# older ones are revalidated with ETag / Last-Modified
+CACHE_DIR = "page_cache"
+CACHE_MAX_BYTES = 2 * 1024 ** 3
+CACHE_MAX_AGE = 7 * 24 * 3600
 
-def get_bathroom(tree) -> Optional[int]:
-    text = tree.xpath("//span[@class='attr important']")
-    if not text: return None
+# durable job queue, so an interrupted run picks up where it stopped
+JOBS_DB = "scrape_jobs.db"
+MAX_ATTEMPTS = 3
+FLUSH_EVERY = 500
 
-    clean = text[0].text_content().strip()
 
-    if not clean: return None
-
-    ba_index = clean.find("Ba")
-    if ba_index != -1:
-        bathrooms = clean[ba_index - 1]
-        if bathrooms.isdigit():
-            return bathrooms
-
-    return None
-
-
-def process_listing(url, session):
-    headers = {"User-Agent": random.choice(USER_AGENTS)}
-    response = session.get(url=url, headers=headers)
-    tree = html.fromstring(response.text)
-
-    zip_code = get_zip_code(tree)
-    desc = get_description(tree)
-    bathrooms = get_bathroom(tree)
+def parse_listing(url: str, text: str) -> Dict:
+    """Builds the detail record for one listing page from its HTML."""
+    details = extract_listing(text)
 
+    # beds and sqft already come from the search results (samples.csv),
+    # so only the fields the search page doesn't have are added here
     result = {
         "url": url,
-        "zip code": zip_code,
-        "description": desc,
-        "bathrooms": bathrooms
+        "zip code": details["zip_code"],
+        "description": details["description"],
+        "bathrooms": details["baths"],
+        "laundry": details["laundry"],
+        "parking": details["parking"],
+        "latitude": details["latitude"],
+        "longitude": details["longitude"],
     }
 
-    print(result)
     return result
 
 
-def download_all_sites(sites: list):
-    session = requests.Session()
+def reparse_from_cache(sites: Optional[list] = None) -> List[Dict]:
+    """
+    Re-runs the parser over cached pages only, with no network access.
+    Useful after changing the extraction logic. Uncached URLs are skipped.
+    """
     records: List[Dict] = []
-    with ThreadPoolExecutor(max_workers=min(32, os.cpu_count() + 4)) as executor:
-        futures = [executor.submit(process_listing, url, session) for url in sites[1453:]]
-
-        for fut in tqdm(as_completed(futures), total=len(futures), desc="Processing"):
-            record = fut.result()
-            records.append(record)
+    with PageCache(CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE) as cache:
+        for url in (sites if sites is not None else cache.urls()):
+            page = cache.get(url)
+            if page is not None:
+                records.append(parse_listing(url, page.text))
 
     return records
 
 
 def task():
     df = pd.read_csv('samples.csv')
-    x = df['url'].to_list()
 
     start_time = time.time()
-    records = download_all_sites(x)
-    print(f"Elapsed time: {time.time() - start_time}, scraped {len(records)} records")
-
-    details_df = pd.DataFrame(records)
-
-    merged = df.merge(details_df, on="url", how="left")
-    merged.to_csv("merged.csv", index=False)
+    with JobQueue(JOBS_DB, max_attempts=MAX_ATTEMPTS) as queue, \
+            PageCache(CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE) as cache:
+        added = queue.enqueue(df['url'])
+        print(f"Queued {added} new urls, {queue.remaining()} left to scrape")
+
+        run_queue(
+            queue,
+            parse_listing,
+            concurrency=PER_HOST_CONCURRENCY,
+            parse_workers=PARSE_WORKERS,
+            flush_every=FLUSH_EVERY,
+            per_host_limit=PER_HOST_CONCURRENCY,
+            rate=REQUESTS_PER_SECOND,
+            timeout=REQUEST_TIMEOUT,
+            max_retries=MAX_RETRIES,
+            user_agents=USER_AGENTS,
+            cache=cache,
+        )
+
+        written = queue.export_merged(df, "merged.csv")
+
+    print(f"Elapsed time: {time.time() - start_time}, wrote {written} rows to merged.csv")
 
 
 if __name__ == '__main__':
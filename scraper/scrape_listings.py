@@ -1,8 +1,9 @@
 #diag.py
 import time
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 import pandas as pd
+import requests
 
 from selenium import webdriver
 from selenium.webdriver.chrome.options import Options
@@ -11,12 +12,26 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import TimeoutException
 
+from bucket_planner import harvest_adaptive, load_plan, save_counts
+from harvest_http import HarvestError, harvest_bucket
+
 BASE_URL = "https://sfbay.craigslist.org/search/san-francisco-ca/apa"
 
 START_PRICE = 600
 BUCKET_WIDTH = 200
 MAX_SEARCH_PRICE = 9000
 
+# craigslist stops returning results past this many per search; buckets that
+# hit it are split, down to MIN_BUCKET_WIDTH dollars
+RESULT_CAP = 3000
+MIN_BUCKET_WIDTH = 25
+HARVEST_WORKERS = 4
+BUCKET_COUNTS_PATH = "bucket_counts.csv"
+
+# "http" reads the static search page directly and only starts Chrome for buckets
+# it can't read; "selenium" always scrolls the page in a browser
+HARVEST_MODE = "http"
+
 
 def get_scroll_root(driver):
     """
@@ -42,12 +57,14 @@ def get_scroll_root(driver):
     return None, "window"
 
 
-def scrape_bucket(driver, wait, min_price: int, max_price: int) -> Dict[str, Dict]:
+def scrape_bucket(driver, wait, min_price: int, max_price: Optional[int]) -> Dict[str, Dict]:
     """
     Scrape one price bucket (min_price to max_price) using the virtualized
     scrolling logic. Returns a dict: pid -> listing_info.
     """
-    url = f"{BASE_URL}?min_price={min_price}&max_price={max_price}"
+    url = f"{BASE_URL}?min_price={min_price}"
+    if max_price is not None:
+        url += f"&max_price={max_price}"
     print(f"\n=== Bucket ${min_price} to ${max_price} ===")
     print(f"Loading: {url}")
     driver.get(url)
@@ -168,69 +185,73 @@ def scrape_bucket(driver, wait, min_price: int, max_price: int) -> Dict[str, Dic
     return listings_by_pid
 
 
-def main():
-    options = Options()
-    # comment this out if you want to watch it scroll
-    # options.add_argument("--headless=new")
-    options.add_argument("--start-maximized")
-
-    driver = webdriver.Chrome(options=options)
-    wait = WebDriverWait(driver, 20)
-
-    all_listings_by_pid: Dict[str, Dict] = {}
-    global_pids = set()
-
-    min_price = START_PRICE
-    empty_buckets_in_a_row = 0
-
-    try:
-        while min_price < MAX_SEARCH_PRICE:
-            max_price = min_price + BUCKET_WIDTH
-
-            bucket_listings = scrape_bucket(driver, wait, min_price, max_price)
-
-            # Count new vs duplicate in this bucket (relative to global set)
-            new_from_bucket = 0
-            for pid, listing in bucket_listings.items():
-                if pid not in global_pids:
-                    global_pids.add(pid)
-                    all_listings_by_pid[pid] = listing
-                    new_from_bucket += 1
-
-            print(
-                f"=== Bucket summary ${min_price}-{max_price}: "
-                f"{len(bucket_listings)} unique in bucket, "
-                f"{new_from_bucket} new globally, "
-                f"{len(all_listings_by_pid)} total unique so far ==="
-            )
-
-            # Heuristic: if a bucket has zero results, count it and possibly stop
-            if len(bucket_listings) == 0:
-                empty_buckets_in_a_row += 1
-            else:
-                empty_buckets_in_a_row = 0
-
-            # After a few empty buckets in a row, assume we've gone past the useful price range
-            if empty_buckets_in_a_row >= 2:
-                print("Hit 3 empty buckets in a row; assuming no more listings at higher prices.")
-                break
-
-            min_price = max_price  # move to next price range
+class BucketHarvester:
+    """
+    Harvests price buckets over plain HTTP, falling back to the Selenium
+    scroller per bucket. Chrome is only started the first time it's needed.
+    """
 
-        print("\n=== GLOBAL SUMMARY ===")
-        print(f"Total unique listings across all buckets: {len(all_listings_by_pid)}")
+    def __init__(self, mode: str = HARVEST_MODE):
+        self.mode = mode
+        self.session = requests.Session()
+        self.driver = None
+        self.wait = None
+
+    def _browser(self):
+        if self.driver is None:
+            options = Options()
+            # comment this out if you want to watch it scroll
+            # options.add_argument("--headless=new")
+            options.add_argument("--start-maximized")
+
+            self.driver = webdriver.Chrome(options=options)
+            self.wait = WebDriverWait(self.driver, 20)
+        return self.driver, self.wait
+
+    def harvest(self, min_price: int, max_price: Optional[int]) -> Dict[str, Dict]:
+        if self.mode == "http":
+            try:
+                listings = harvest_bucket(self.session, BASE_URL, min_price, max_price)
+                print(f"  Bucket ${min_price}-{max_price} over HTTP: {len(listings)} unique PIDs")
+                return listings
+            except HarvestError as e:
+                print(f"  HTTP harvest failed for ${min_price}-{max_price} ({e}); falling back to Selenium")
+
+        driver, wait = self._browser()
+        return scrape_bucket(driver, wait, min_price, max_price)
+
+    def close(self):
+        self.session.close()
+        if self.driver is not None:
+            self.driver.quit()
 
-        print("\nSample listings:")
-        print(len(list(all_listings_by_pid.values())))
-        for item in list(all_listings_by_pid.values())[:5]:
-            print(item)
-        
-        samples = [item for item in list(all_listings_by_pid.values())]
-        df = pd.DataFrame(samples)
-        df.to_csv('samples.csv')
 
-    finally:
-        driver.quit()
+def main():
+    plan = load_plan(BUCKET_COUNTS_PATH, START_PRICE, MAX_SEARCH_PRICE, BUCKET_WIDTH, RESULT_CAP, MIN_BUCKET_WIDTH)
+    print(f"Harvesting {len(plan)} buckets with {HARVEST_WORKERS} workers")
+
+    all_listings_by_pid, counts = harvest_adaptive(
+        plan,
+        BucketHarvester,
+        workers=HARVEST_WORKERS,
+        cap=RESULT_CAP,
+        min_width=MIN_BUCKET_WIDTH,
+    )
+
+    # next run plans its buckets from these counts
+    save_counts(BUCKET_COUNTS_PATH, counts)
+
+    print("\n=== GLOBAL SUMMARY ===")
+    print(f"Total unique listings across all buckets: {len(all_listings_by_pid)}")
+
+    print("\nSample listings:")
+    print(len(list(all_listings_by_pid.values())))
+    for item in list(all_listings_by_pid.values())[:5]:
+        print(item)
+
+    samples = [item for item in list(all_listings_by_pid.values())]
+    df = pd.DataFrame(samples)
+    df.to_csv('samples.csv')
 
 
 if __name__ == "__main__":
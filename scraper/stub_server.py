@@ -0,0 +1,129 @@
+"""
+Local stub of the Craigslist detail pages, used to benchmark the scraper offline.
+
+Every `/<anything>/<post id>.html` path is answered with one of the saved pages in
+`fixtures/`, after an optional artificial latency. A fraction of requests can be
+answered with 429 to exercise the retry/backoff path. Pages carry an ETag, and a
+matching If-None-Match is answered with 304.
+
+    python stub_server.py            # benchmark 2,000 pages
+    python stub_server.py 60000 0.1  # 60k pages with 100ms of latency each
+"""
+import hashlib
+import os
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixtures() -> list:
+    pages = []
+    for name in sorted(os.listdir(FIXTURE_DIR)):
+        if name.endswith(".html"):
+            with open(os.path.join(FIXTURE_DIR, name), "rb") as f:
+                pages.append(f.read())
+    return pages
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    # keep-alive, so the client's connection pool is exercised like the real site
+    protocol_version = "HTTP/1.1"
+
+    pages: list = []
+    latency: float = 0.0
+    error_rate: float = 0.0
+
+    def do_GET(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+        if random.random() < self.error_rate:
+            self.send_response(429)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        # the same post id always gets the same fixture page
+        digits = "".join(ch for ch in self.path if ch.isdigit()) or "0"
+        body = self.pages[int(digits) % len(self.pages)]
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        self.send_response(200)
+        self.send_header("ETag", etag)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # silence the per-request access log
+        pass
+
+
+def serve_in_background(port: int = 0, latency: float = 0.0, error_rate: float = 0.0):
+    """
+    Starts the stub server on a daemon thread.
+    Returns (server, base_url); call server.shutdown() when done.
+    """
+    handler = type("Handler", (StubHandler,), {
+        "pages": load_fixtures(),
+        "latency": latency,
+        "error_rate": error_rate,
+    })
+    server = ThreadingHTTPServer(("127.0.0.1", port), handler)
+    server.daemon_threads = True
+
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    host, port = server.server_address
+    return server, f"http://{host}:{port}"
+
+
+def stub_urls(base_url: str, n: int) -> list:
+    """Fake listing URLs shaped like the real ones in samples.csv."""
+    return [f"{base_url}/sfc/apa/d/san-francisco-listing/{7800000000 + i}.html" for i in range(n)]
+
+
+def benchmark(n: int = 2000, latency: float = 0.05, error_rate: float = 0.01):
+    from async_fetch import scrape_listings
+    from scrape_details import parse_listing
+
+    server, base_url = serve_in_background(latency=latency, error_rate=error_rate)
+    try:
+        start_time = time.time()
+        records = scrape_listings(
+            stub_urls(base_url, n),
+            parse_listing,
+            concurrency=64,
+            per_host_limit=64,
+            rate=10000,
+            burst=100,
+            backoff_base=0.01,
+            show_progress=False,
+        )
+        elapsed = time.time() - start_time
+    finally:
+        server.shutdown()
+
+    print(f"Scraped {len(records)} stub pages in {elapsed:.2f}s ({len(records) / elapsed:.0f} pages/sec)")
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    benchmark(
+        n=int(args[0]) if len(args) > 0 else 2000,
+        latency=float(args[1]) if len(args) > 1 else 0.05,
+    )
@@ -0,0 +1,127 @@
+"""
+Full-text search over listing descriptions, through the rentals_fts index.
+
+rentals_fts (FTS5, see create_db.migration_8) is kept in sync with rentals by
+triggers, so searches never scan or regex the descriptions. Queries use FTS5
+syntax: "in-unit laundry" for a phrase, laund* for a prefix, AND / OR / NOT,
+NEAR(a b, 5). Matches are ranked by BM25 and can be combined with filters on
+price, bedrooms and zip code.
+
+    from search import search, phrase
+    search(phrase('in-unit laundry'), zip_codes=['94110'], max_price=3500)
+
+    python search.py '"in-unit laundry"' --zip 94110 --max-price 3500
+"""
+import sqlite3
+import sys
+import time
+
+import pandas as pd
+
+from create_db import migrate
+
+DB_NAME = 'rentals.db'
+RESULT_COLUMNS = ['post_id', 'price', 'bedrooms', 'bathrooms', 'sqft', 'zip_code', 'neighborhood', 'scraped_date']
+
+
+def phrase(text):
+    """Quotes text as one FTS5 phrase, so punctuation like '-' or '/' isn't read as syntax."""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def search(query, min_price=None, max_price=None, bedrooms=None, min_bedrooms=None,
+           zip_codes=None, limit=50, snippets=True, db_path=DB_NAME, conn=None):
+    """
+    Listings whose description matches an FTS5 query, best BM25 match first.
+
+    query:            FTS5 query, e.g. '"in-unit laundry" AND parking', 'balcon*'
+    min/max_price:    inclusive price range
+    bedrooms:         exact bedroom count; min_bedrooms: at least this many
+    zip_codes:        only listings in these zip codes
+    limit:            number of rows to return (None for all)
+    snippets:         add a short excerpt around the matched terms
+    """
+    where, params = ["rentals_fts MATCH ?"], [query]
+    if min_price is not None:
+        where.append("r.price >= ?")
+        params.append(min_price)
+    if max_price is not None:
+        where.append("r.price <= ?")
+        params.append(max_price)
+    if bedrooms is not None:
+        where.append("r.bedrooms = ?")
+        params.append(bedrooms)
+    if min_bedrooms is not None:
+        where.append("r.bedrooms >= ?")
+        params.append(min_bedrooms)
+    if zip_codes is not None:
+        zip_codes = [str(z) for z in zip_codes]
+        where.append(f"r.zip_code IN ({', '.join('?' for _ in zip_codes)})")
+        params.extend(zip_codes)
+
+    # lower bm25() is a better match. CROSS JOIN keeps the index lookup outermost: otherwise
+    # the planner may walk a zip code's listings and re-run the MATCH for every one
+    columns = [f"r.{col}" for col in RESULT_COLUMNS] + ["bm25(rentals_fts) AS score"]
+    if snippets:
+        columns.append("snippet(rentals_fts, 0, '[', ']', '...', 12) AS snippet")
+    sql = f"""
+        SELECT {', '.join(columns)}
+        FROM rentals_fts
+        CROSS JOIN rentals r ON r.id = rentals_fts.rowid
+        WHERE {' AND '.join(where)}
+        ORDER BY score
+    """
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+
+    if conn is not None:
+        return pd.read_sql(sql, conn, params=params)
+    with sqlite3.connect(db_path) as conn:
+        migrate(conn)
+        return pd.read_sql(sql, conn, params=params)
+
+
+def count_matches(query, db_path=DB_NAME, conn=None):
+    """Number of listings matching an FTS5 query (no filters)."""
+    sql = "SELECT COUNT(*) FROM rentals_fts WHERE rentals_fts MATCH ?"
+    if conn is not None:
+        return conn.execute(sql, (query,)).fetchone()[0]
+    with sqlite3.connect(db_path) as conn:
+        migrate(conn)
+        return conn.execute(sql, (query,)).fetchone()[0]
+
+
+def check_index(conn):
+    """Raises sqlite3.DatabaseError if rentals_fts has drifted from rentals."""
+    conn.execute("INSERT INTO rentals_fts(rentals_fts, rank) VALUES ('integrity-check', 1)")
+
+
+def parse_args(argv):
+    # query first, then --zip/--min-price/--max-price/--bedrooms/--min-bedrooms/--limit options
+    options = {'--zip': 'zip_codes', '--min-price': 'min_price', '--max-price': 'max_price',
+               '--bedrooms': 'bedrooms', '--min-bedrooms': 'min_bedrooms', '--limit': 'limit'}
+    if not argv or argv[0] in options:
+        raise SystemExit(__doc__)
+    query, kwargs = argv[0], {}
+    for flag, value in zip(argv[1::2], argv[2::2]):
+        if flag not in options:
+            raise SystemExit(f"unknown option {flag}")
+        name = options[flag]
+        if name == 'zip_codes':
+            kwargs.setdefault(name, []).append(value)
+        elif name in ('bedrooms', 'min_bedrooms'):
+            kwargs[name] = float(value)
+        else:
+            kwargs[name] = int(value)
+    return query, kwargs
+
+
+if __name__ == '__main__':
+    query, kwargs = parse_args(sys.argv[1:])
+    start = time.perf_counter()
+    results = search(query, **kwargs)
+    elapsed = time.perf_counter() - start
+    with pd.option_context('display.max_colwidth', 120, 'display.width', 200):
+        print(results.drop(columns='scraped_date').to_string(index=False))
+    print(f"{len(results)} listings in {elapsed * 1000:.1f} ms")
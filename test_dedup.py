@@ -0,0 +1,96 @@
+"""
+Tests for dedup.py on a small in-memory rentals.db.
+
+    python -m pytest test_dedup.py
+"""
+import sqlite3
+
+import pytest
+
+from create_db import migrate
+from dedup import dedupe
+
+DESCRIPTION = ("Sunny one bedroom apartment on a quiet tree lined street near Dolores Park with "
+               "hardwood floors, a renovated kitchen, in-unit laundry and a shared garden out back. "
+               "Close to the J Church line, cafes and the Mission. Cats are welcome, sorry no dogs.")
+
+
+@pytest.fixture
+def conn():
+    conn = sqlite3.connect(':memory:')
+    migrate(conn)
+    yield conn
+    conn.close()
+
+
+def add_listing(conn, listing_id, price, description=DESCRIPTION, zip_code='94110', bedrooms=1):
+    conn.execute("""
+        INSERT INTO rentals (id, post_id, price, bedrooms, zip_code, full_description, content_hash)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """, (listing_id, str(7800000000 + listing_id), price, bedrooms, zip_code, description,
+          f"{listing_id}-{price}"))
+    conn.commit()
+
+
+def set_price(conn, listing_id, price):
+    # what insert_rentals.apply_incremental does to an edited listing: new values, new content_hash
+    conn.execute("UPDATE rentals SET price = ?, content_hash = ? WHERE id = ?",
+                 (price, f"{listing_id}-{price}", listing_id))
+    conn.commit()
+
+
+def canonical(conn):
+    return dict(conn.execute("SELECT id, canonical_listing_id FROM rentals"))
+
+
+def test_reposts_share_the_earliest_id(conn):
+    add_listing(conn, 5, 800)
+    add_listing(conn, 6, 820)
+    add_listing(conn, 7, 800, description="Studio in the Sunset, parking included, no pets.")
+    dedupe(conn)
+    assert canonical(conn) == {5: 5, 6: 5, 7: 7}
+
+
+def test_listings_without_zip_code_are_not_merged(conn):
+    add_listing(conn, 5, 800, zip_code=None)
+    add_listing(conn, 6, 800, zip_code=None)
+    dedupe(conn)
+    assert canonical(conn) == {5: 5, 6: 6}
+
+
+def test_price_edit_leaves_the_group(conn):
+    add_listing(conn, 5, 800)
+    add_listing(conn, 6, 800)
+    dedupe(conn)
+    assert canonical(conn)[6] == 5
+
+    set_price(conn, 6, 2400)
+    counts = dedupe(conn)
+    assert counts['moved'] == 1
+    assert canonical(conn) == {5: 5, 6: 6}
+
+
+def test_price_edit_joins_a_group(conn):
+    add_listing(conn, 5, 800)
+    add_listing(conn, 6, 2400)
+    dedupe(conn)
+    assert canonical(conn) == {5: 5, 6: 6}
+
+    set_price(conn, 6, 810)
+    dedupe(conn)
+    assert canonical(conn) == {5: 5, 6: 5}
+
+
+def test_deleting_the_earliest_listing_regroups_the_rest(conn):
+    add_listing(conn, 5, 800)
+    add_listing(conn, 6, 800)
+    add_listing(conn, 7, 800)
+    add_listing(conn, 8, 800, description="Studio in the Sunset, parking included, no pets.")
+    dedupe(conn)
+    assert canonical(conn) == {5: 5, 6: 5, 7: 5, 8: 8}
+
+    conn.execute("DELETE FROM rentals WHERE id = 5")
+    conn.commit()
+    counts = dedupe(conn)
+    assert counts['regrouped'] == 2
+    assert canonical(conn) == {6: 6, 7: 6, 8: 8}